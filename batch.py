@@ -0,0 +1,32 @@
+"""
+Batch validation of many queries across processes.
+
+The parser is pure Python and holds the GIL, so threads don't help; parse_many spreads the queries
+over a process pool instead, sending them in chunks to keep the per-query inter-process overhead low.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import os
+
+from sql_parser_v2 import Parser
+
+
+def parse_query(query, **parser_options):
+    return Parser(query, **parser_options).parse()
+
+
+def parse_many(queries, workers=None, chunksize=256, **parser_options):
+    """
+    Parses every query and returns the results in the same order as the queries, exactly as a
+    serial [Parser(query, **parser_options).parse() for query in queries] would.
+    workers is the number of processes (default: one per cpu), workers=1 parses in this process.
+    chunksize is the number of queries sent to a worker at a time.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    parse = functools.partial(parse_query, **parser_options)
+    if workers <= 1:
+        return [parse(query) for query in queries]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(parse, queries, chunksize=chunksize))
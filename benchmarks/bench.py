@@ -0,0 +1,186 @@
+"""
+Benchmark suite comparing sql_parser.py (v1), its grammar on the Earley engine (earley) and sql_parser_v2.py (v2).
+
+For every case the input grows along one dimension (nesting depth, condition terms, join count,
+value list length, statement count) and each size is parsed by each parser that accepts that kind
+of input. v1 only parses conditions, so the join, value list and statement cases are v2 only.
+earley parses the same inputs as v1.
+Each point reports the best time of --repeat runs, tokens/sec, statements/sec and the peak memory
+of one more run under tracemalloc. Tokens are always counted with the v2 tokenizer so both parsers
+are measured against the same number. A parser that runs out of stack records the error instead.
+
+Run from the repository root:
+    python -m benchmarks.bench [--quick] [--output results.json]
+    python -m benchmarks.bench --compare old.json new.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import earley
+import sql_parser
+import sql_parser_v2
+from benchmarks import generate
+
+parsers = {
+    'v1': sql_parser.Parser,
+    'earley': earley.EarleyParser,
+    'v2': sql_parser_v2.Parser,
+}
+
+# case -> (sizes, quick sizes, {parser: size -> input}, size -> statement count)
+cases = {
+    'depth': (
+        [1, 10, 50, 100, 200], [1, 10, 50],
+        {'v1': lambda n: generate.condition(1, n), 'earley': lambda n: generate.condition(1, n), 'v2': lambda n: generate.select_query(1, n)},
+        lambda n: 1,
+    ),
+    'terms': (
+        [10, 100, 1000, 10000], [10, 100, 1000],
+        {'v1': lambda n: generate.condition(n), 'earley': lambda n: generate.condition(n), 'v2': lambda n: generate.select_query(n)},
+        lambda n: 1,
+    ),
+    'joins': (
+        [1, 10, 100, 1000], [1, 10, 100],
+        {'v2': lambda n: generate.select_query(joins=n)},
+        lambda n: 1,
+    ),
+    'values': (
+        [10, 100, 1000, 10000, 100000], [10, 100, 1000],
+        {'v2': generate.insert_query},
+        lambda n: 1,
+    ),
+    'statements': (
+        [10, 100, 1000, 10000], [10, 100, 1000],
+        {'v2': generate.script},
+        lambda n: n,
+    ),
+}
+
+
+def count_tokens(text):
+    return len(sql_parser_v2.Parser(text).tokenize(text))
+
+
+def measure(parser_class, text, repeat):
+    # best time over repeat runs, then the peak memory of one more run
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = parser_class(text).parse()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    parser_class(text).parse()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def run_point(parser_name, text, statements, repeat):
+    tokens = count_tokens(text)
+    point = {'parser': parser_name, 'bytes': len(text), 'tokens': tokens, 'statements': statements}
+    try:
+        result, elapsed, peak = measure(parsers[parser_name], text, repeat)
+    except RecursionError:
+        tracemalloc.stop()
+        point['error'] = 'RecursionError'
+        return point
+    point.update({
+        'result': str(result),
+        'seconds': elapsed,
+        'tokens_per_sec': tokens / elapsed if elapsed else None,
+        'statements_per_sec': statements / elapsed if elapsed else None,
+        'peak_bytes': peak,
+    })
+    return point
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(selected, quick, repeat):
+    results = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'quick': quick,
+            'repeat': repeat,
+        },
+        'cases': {},
+    }
+    for name in selected:
+        sizes, quick_sizes, inputs, statement_count = cases[name]
+        points = results['cases'][name] = []
+        print(name)
+        for size in (quick_sizes if quick else sizes):
+            for parser_name, make_input in inputs.items():
+                point = run_point(parser_name, make_input(size), statement_count(size), repeat)
+                point['size'] = size
+                points.append(point)
+                print('  ' + format_point(point))
+    return results
+
+
+def format_point(point):
+    line = f"{point['parser']:<6} {point['size']:>7}  {point['tokens']:>8} tokens"
+    if 'error' in point:
+        return line + f"  {point['error']}"
+    return line + (
+        f"  {point['seconds'] * 1000:9.2f}ms"
+        f"  {point['tokens_per_sec']:10.0f} tokens/s"
+        f"  {point['statements_per_sec']:9.0f} statements/s"
+        f"  {point['peak_bytes'] / 1024:9.1f}KiB peak"
+        f"  {point['result']}"
+    )
+
+
+def compare(old_path, new_path):
+    # prints the change in time and peak memory of every point found in both runs
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"old: {old['meta']['commit']}  new: {new['meta']['commit']}")
+    for name, new_points in new['cases'].items():
+        old_points = {(p['parser'], p['size']): p for p in old['cases'].get(name, [])}
+        print(name)
+        for point in new_points:
+            before = old_points.get((point['parser'], point['size']))
+            if before is None:
+                continue
+            label = f"  {point['parser']:<6} {point['size']:>7}"
+            if 'error' in point or 'error' in before:
+                print(f"{label}  {before.get('error', 'ok')} -> {point.get('error', 'ok')}")
+                continue
+            time_change = point['seconds'] / before['seconds'] - 1
+            memory_change = point['peak_bytes'] / before['peak_bytes'] - 1 if before['peak_bytes'] else 0
+            print(f"{label}  time {time_change:+7.1%}  peak memory {memory_change:+7.1%}")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--case', action='append', choices=list(cases), help='run only these cases')
+    arg_parser.add_argument('--quick', action='store_true', help='smaller sizes only')
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--output', help='write the results to this JSON file')
+    arg_parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    args = arg_parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        sys.exit()
+    results = run(args.case or list(cases), args.quick, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,164 @@
+"""
+Equivalence checks over a random corpus, for changes that must not change what is accepted.
+
+Runs the inputs of generate.corpus() through each of the ways this repository has of parsing them and
+checks them against sql_parser_v2.Parser on the whole input:
+- ll1: LL1Parser accepts exactly the same inputs;
+- stream: sql_stream.iter_statements and parallel.parse_text accept the same scripts;
+- cache: ParseCache gives the same results, also for copies with other literals and spacing;
+- pickle: results are unchanged by a pickle round trip, in default, recover, offset and tree modes;
+- incremental: after every one of a series of random edits, IncrementalParser has the same result,
+  tree and segment starts as a fresh IncrementalParser, and accepts what the whole-script parser does;
+- against: with --against REVISION, results and trees equal those of sql_parser_v2.py at that revision
+  (trees are expected to differ across a change to how they are built, --no-trees leaves them out).
+Prints the mismatches of each check and exits with status 1 if there were any.
+
+Run from the repository root:
+    python -m benchmarks.check [--scripts 3000] [--seed 7] [--check ll1 ...] [--against HEAD~1]
+"""
+import argparse
+import io
+import pickle
+import random
+import sys
+
+from benchmarks import generate
+from benchmarks.micro import load_revision
+from incremental import IncrementalParser
+from ll1 import LL1Parser
+import parallel
+from parse_cache import ParseCache
+from sql_parser_v2 import Parser
+import sql_stream
+
+modes = [{}, {'recover': True}, {'offset': 17}, {'build_tree': True}]
+# what an incremental edit inserts: statement pieces and the characters that move statement boundaries
+edit_pieces = [';', "'", '/*', '*/', ' ', '\n', 'SELECT * FROM users;', 'WHERE id = 1', 'x', '/', '*', 'DELETE FROM orders;']
+
+
+def fields(result):
+    return str(result), [(error.kind, error.span, error.expected, error.got, error.index) for error in result.errors]
+
+
+def check_ll1(inputs, args):
+    for text in inputs:
+        expected, result = Parser(text).parse(), LL1Parser(text).parse()
+        if expected.ok != result.ok:
+            yield text, f'v2: {expected}  ll1: {result}'
+
+
+def check_stream(inputs, args):
+    for text in inputs:
+        expected = Parser(text).parse()
+        if not text.strip(): # no statements to split into
+            continue
+        streamed = all(result.ok for _, result in sql_stream.iter_statements(io.StringIO(text), chunk_size=16))
+        if streamed != expected.ok:
+            yield text, f'v2: {expected}  iter_statements ok: {streamed}'
+        result = parallel.parse_text(text, workers=1, batch_size=64)
+        if result.ok != expected.ok:
+            yield text, f'v2: {expected}  parse_text: {result}'
+
+
+def respace(rng, text):
+    # text with other literal values and spacing, the same query shape for the cache
+    return text.replace(' ', '  ' if rng.random() < 0.5 else ' ').replace("'abc'", "'zz'").replace('12', '98765')
+
+
+def check_cache(inputs, args):
+    cache = ParseCache(maxsize=500)
+    rng = random.Random(args.seed)
+    for _ in range(2): # the second pass is answered from the cache
+        for text in inputs:
+            for query in (text, respace(rng, text)):
+                expected, result = Parser(query).parse(), cache.parse(query)
+                if fields(expected) != fields(result):
+                    yield query, f'v2: {expected}  cache: {result}'
+
+
+def check_pickle(inputs, args):
+    for text in inputs:
+        for options in modes:
+            result = Parser(text, **options).parse()
+            if fields(pickle.loads(pickle.dumps(result))) != fields(result):
+                yield text, f'{options}: {result} changed by pickling'
+
+
+def check_incremental(inputs, args):
+    rng = random.Random(args.seed)
+    statements = inputs[:800]
+    for recover in (False, True):
+        for build_tree in (False, True):
+            for _ in range(args.edits // 25): # trials of 25 edits
+                text = '\n'.join(rng.sample(statements, rng.randint(0, 6)))
+                parser = IncrementalParser(text, build_tree=build_tree, recover=recover)
+                for _ in range(25):
+                    start = rng.randint(0, len(text))
+                    inserted = rng.choice(edit_pieces + statements + [''])
+                    if rng.random() < 0.2: # a whole-text change
+                        end = start + rng.randint(0, min(5, len(text) - start))
+                        text = text[:start] + inserted + text[end:]
+                        result = parser.update(text)
+                    else:
+                        deleted = rng.randint(0, min(rng.choice([0, 1, 3, 40]), len(text) - start))
+                        result = parser.edit(start, deleted, inserted)
+                        text = text[:start] + inserted + text[start + deleted:]
+                    fresh = IncrementalParser(text, build_tree=build_tree, recover=recover)
+                    same = (
+                        parser.text == text and str(result) == str(fresh.result)
+                        and [parser.start(i) for i in range(len(parser.starts))] == fresh.starts
+                        and (not build_tree or parser.tree == fresh.tree)
+                    )
+                    whole = Parser(text, recover=recover).parse()
+                    if not same or whole.ok != result.ok:
+                        yield text, f'recover={recover} build_tree={build_tree}: {result}  fresh: {fresh.result}  whole: {whole}'
+                        break
+
+
+def check_against(inputs, args):
+    old = load_revision(args.against)
+    for text in inputs:
+        for options in modes:
+            old_parser, parser = old.Parser(text, **options), Parser(text, **options)
+            old_result, result = old_parser.parse(), parser.parse()
+            # str() compares results with revisions from before ParseResult too
+            if str(old_result) != str(result):
+                yield text, f'{options}: {args.against}: {old_result}  now: {result}'
+                break
+            if options.get('build_tree') and args.trees and old_parser.tree != parser.tree:
+                yield text, f'{options}: trees differ'
+                break
+
+
+checks = {
+    'll1': check_ll1,
+    'stream': check_stream,
+    'cache': check_cache,
+    'pickle': check_pickle,
+    'incremental': check_incremental,
+    'against': check_against,
+}
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--scripts', type=int, default=3000, help='random scripts, each also checked broken')
+    arg_parser.add_argument('--seed', type=int, default=7)
+    arg_parser.add_argument('--edits', type=int, default=3750, help='incremental edits per mode')
+    arg_parser.add_argument('--check', action='append', choices=list(checks), help='run only these checks')
+    arg_parser.add_argument('--against', metavar='REVISION', help='also compare with sql_parser_v2.py as of this git revision')
+    arg_parser.add_argument('--no-trees', dest='trees', action='store_false', help='compare only results with --against')
+    args = arg_parser.parse_args()
+
+    inputs = generate.corpus(args.scripts, args.seed)
+    selected = args.check or [name for name in checks if name != 'against' or args.against]
+    failed = False
+    for name in selected:
+        if name == 'against' and not args.against:
+            arg_parser.error('the against check needs --against REVISION')
+        mismatches = list(checks[name](inputs, args))
+        print(f'{name:<12} {len(mismatches)} mismatches')
+        for text, description in mismatches[:5]:
+            print(f'    {text!r}\n        {description}')
+        failed = failed or bool(mismatches)
+    sys.exit(1 if failed else 0)
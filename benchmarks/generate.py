@@ -0,0 +1,166 @@
+"""
+Synthetic queries of a controlled size for the benchmarks.
+
+Every generator is deterministic so the same arguments always give the same text, which keeps
+results from different commits comparable. Conditions only use what both parsers accept, so they
+can be given to sql_parser.py as they are and to sql_parser_v2.py inside a query.
+
+corpus() gives random scripts over the whole v2 grammar, with a copy of each broken by a token edit
+or two, for the equivalence checks in benchmarks/check.py; a seed always gives the same corpus.
+"""
+import random
+import re
+
+
+def nested_term(depth, term='amount'):
+    # amount wrapped in depth pairs of brackets
+    return '(' * depth + term + ')' * depth
+
+
+def condition(terms=1, depth=0):
+    # terms comparisons joined with AND / OR, each side nested depth brackets deep
+    comparisons = [f'{nested_term(depth)} > {i}' for i in range(terms)]
+    condition = comparisons[0]
+    for i, comparison in enumerate(comparisons[1:]):
+        condition += (' AND ' if i % 2 == 0 else ' OR ') + comparison
+    return condition
+
+
+def select_query(terms=1, depth=0, joins=0):
+    query = 'SELECT users.id, users.email FROM users'
+    for i in range(joins):
+        query += ' INNER JOIN orders ON users.id = orders.user_id'
+    return query + ' WHERE ' + condition(terms, depth) + ';'
+
+
+def insert_query(values=1):
+    return 'INSERT INTO orders (amount) VALUES (' + ', '.join(str(i) for i in range(values)) + ');'
+
+
+def script(statements=1):
+    # a mix of the four statement kinds and comments
+    kinds = [
+        select_query(terms=3, depth=1, joins=1),
+        insert_query(values=4),
+        "UPDATE users SET (email = 'a@b.com', first_name = 'A') WHERE id = 1;",
+        'DELETE FROM orders WHERE amount < 10;',
+        '/* generated */',
+    ]
+    return '\n'.join(kinds[i % len(kinds)] for i in range(statements))
+
+
+# random scripts over the v2 grammar, for the users and orders tables of the default catalog
+tables = ['users', 'orders']
+fields = ['id', 'email', 'first_name', 'last_name', 'user_id', 'date', 'amount']
+functions = ['UPPER', 'LOWER', 'ROUND', 'LENGTH', 'ABS', 'SUM', 'AVG', 'COUNT', 'MAX', 'MIN']
+values = ["'abc'", "'%@x.com'", '12', '3.5', '0']
+# pieces a broken copy can have inserted: unknown names, a stray character, an unterminated string, a lowercase keyword
+edit_tokens = ['xyz', '@', ';', 'idx', 'users_archive', "'q", 'select']
+edit_token_pattern = re.compile(r"'[^']*'|\d+\.\d+|\d+|/\*.*?\*/|\w+|<=|>=|!=|\S", re.DOTALL)
+
+
+def random_list(rng, item, more=0.4):
+    items = [item(rng)]
+    while rng.random() < more:
+        items.append(item(rng))
+    return ', '.join(items)
+
+
+def random_table_field(rng):
+    return rng.choice(fields) if rng.random() < 0.5 else rng.choice(tables) + '.' + rng.choice(fields)
+
+
+def random_term(rng, depth):
+    x = rng.random()
+    if x < 0.15 and depth < 3:
+        return '(' + random_math_expression(rng, depth + 1) + ')'
+    return rng.choice(values) if x < 0.5 else random_table_field(rng)
+
+
+def random_math_expression(rng, depth=0):
+    if rng.random() < 0.15 and depth < 3:
+        return rng.choice(functions) + '(' + random_math_expression(rng, depth + 1) + ')'
+    expression = random_term(rng, depth)
+    while rng.random() < 0.3:
+        expression += ' ' + rng.choice('+-*/') + ' ' + random_term(rng, depth)
+    return expression
+
+
+def random_condition(rng):
+    def predicate(rng):
+        x = rng.random()
+        if x < 0.2:
+            return random_table_field(rng) + " LIKE 'a%'"
+        if x < 0.35:
+            return random_table_field(rng) + ' IS ' + rng.choice(['', 'NOT ']) + 'NULL'
+        return random_math_expression(rng) + ' ' + rng.choice(['=', '!=', '<', '>', '<=', '>=']) + ' ' + random_math_expression(rng)
+    condition = predicate(rng)
+    while rng.random() < 0.4:
+        condition += ' ' + rng.choice(['AND', 'OR']) + ' ' + predicate(rng)
+    return condition
+
+
+def random_select(rng):
+    def column(rng):
+        column = rng.choice(functions) + '(' + random_table_field(rng) + ')' if rng.random() < 0.3 else random_table_field(rng)
+        return column + " AS 'n'" if rng.random() < 0.3 else column
+    query = 'SELECT ' + ('DISTINCT ' if rng.random() < 0.2 else '') + ('*' if rng.random() < 0.2 else random_list(rng, column))
+    query += ' FROM ' + rng.choice(tables)
+    while rng.random() < 0.3:
+        query += ' ' + rng.choice(['RIGHT', 'LEFT', 'INNER', 'FULL']) + ' JOIN ' + rng.choice(tables) + ' ON ' + random_condition(rng)
+    if rng.random() < 0.5:
+        query += ' WHERE ' + random_condition(rng)
+    if rng.random() < 0.2:
+        query += ' GROUP BY ' + random_list(rng, random_table_field)
+    if rng.random() < 0.2:
+        query += ' HAVING ' + random_condition(rng)
+    if rng.random() < 0.2:
+        query += ' ORDER BY ' + random_list(rng, lambda rng: random_table_field(rng) + rng.choice(['', ' ASC', ' DESC']))
+    return query
+
+
+def random_statement(rng):
+    x = rng.random()
+    if x < 0.4:
+        return random_select(rng) + ';'
+    if x < 0.6:
+        return 'INSERT INTO ' + rng.choice(tables) + ' (' + random_list(rng, random_table_field) + ') VALUES (' + random_list(rng, lambda rng: rng.choice(values)) + ');'
+    if x < 0.75:
+        query = 'UPDATE ' + rng.choice(tables) + ' SET (' + random_list(rng, lambda rng: random_table_field(rng) + ' = ' + rng.choice(values)) + ')'
+        return query + (' WHERE ' + random_condition(rng) if rng.random() < 0.5 else '') + ';'
+    if x < 0.9:
+        return 'DELETE FROM ' + rng.choice(tables) + (' WHERE ' + random_condition(rng) if rng.random() < 0.5 else '') + ';'
+    return f'/* comment {rng.randint(0, 9)} */'
+
+
+def random_script(rng):
+    return '\n'.join(random_statement(rng) for _ in range(rng.randint(1, 3)))
+
+
+def break_script(rng, script):
+    # script with one or two of its tokens deleted, swapped or inserted, which mostly makes it invalid
+    tokens = edit_token_pattern.findall(script)
+    for _ in range(rng.randint(1, 2)):
+        if not tokens:
+            break
+        i = rng.randrange(len(tokens))
+        x = rng.random()
+        if x < 0.4:
+            del tokens[i]
+        elif x < 0.7:
+            tokens.insert(i, rng.choice(tokens + edit_tokens))
+        else:
+            j = rng.randrange(len(tokens))
+            tokens[i], tokens[j] = tokens[j], tokens[i]
+    return ' '.join(tokens)
+
+
+def corpus(scripts=3000, seed=7):
+    # a few edge cases, then scripts random scripts each followed by a broken copy
+    rng = random.Random(seed)
+    inputs = ['', '   ', ';', 'SELECT', 'SELECT * FROM users', 'SELECT * FROM users;', 'idx', 'users_archive', '@']
+    for _ in range(scripts):
+        script = random_script(rng)
+        inputs.append(script)
+        inputs.append(break_script(rng, script))
+    return inputs
@@ -0,0 +1,84 @@
+"""
+Micro-benchmark of the v2 parser's decision points on a deep WHERE clause.
+
+The clause mixes every kind of predicate, so every decision the parse methods make per token is
+exercised: comparisons of arithmetic on table fields and functions, LIKE and IS [NOT] NULL on
+table.field, nested brackets and AND / OR. The query is tokenized once and only parse_tokens() is
+timed, giving the parsing cost per token without the tokenizer. --against runs the same on
+sql_parser_v2.py as of another git revision, for a before / after comparison in one run.
+
+Run from the repository root:
+    python -m benchmarks.micro [--predicates 2000] [--depth 3] [--against HEAD~1]
+"""
+import argparse
+import subprocess
+import time
+import types
+
+import sql_parser_v2
+
+predicates = [
+    'users.id + {i} * 2 > ({i})',
+    "users.email LIKE '%@x.com'",
+    'ROUND(orders.amount / 3) <= {i}.5',
+    'orders.date IS NOT NULL',
+    'amount - (user_id + {i}) != id',
+    'first_name IS NULL',
+]
+
+
+def deep_where(count, depth):
+    # a query whose WHERE clause has count predicates, every third one wrapped in depth brackets around its left side
+    parts = []
+    for i in range(count):
+        predicate = predicates[i % len(predicates)].format(i=i)
+        if i % 3 == 0 and ' > ' in predicate:
+            left, right = predicate.split(' > ')
+            predicate = '(' * depth + left + ')' * depth + ' > ' + right
+        parts.append(predicate)
+    condition = parts[0]
+    for i, part in enumerate(parts[1:]):
+        condition += (' AND ' if i % 2 == 0 else ' OR ') + part
+    return 'SELECT users.id FROM users INNER JOIN orders ON users.id = orders.user_id WHERE ' + condition + ';'
+
+
+def load_revision(revision):
+    # sql_parser_v2 as of a git revision, as a module of its own
+    source = subprocess.run(['git', 'show', f'{revision}:sql_parser_v2.py'], capture_output=True, text=True, check=True).stdout
+    module = types.ModuleType(f'sql_parser_v2 at {revision}')
+    exec(compile(source, f'{revision}:sql_parser_v2.py', 'exec'), module.__dict__)
+    return module
+
+
+def measure(module, query, repeat):
+    # best time of repeat parses of the tokens of query, and the result
+    parser = module.Parser(query)
+    tokens = parser.tokenize(query)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = parser.parse_tokens(tokens)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(tokens), result
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--predicates', type=int, default=2000)
+    arg_parser.add_argument('--depth', type=int, default=3)
+    arg_parser.add_argument('--repeat', type=int, default=100)
+    arg_parser.add_argument('--against', metavar='REVISION', help='also run sql_parser_v2.py as of this git revision')
+    args = arg_parser.parse_args()
+
+    query = deep_where(args.predicates, args.depth)
+    modules = {'working tree': sql_parser_v2}
+    if args.against:
+        modules = {args.against: load_revision(args.against), **modules}
+    times = {}
+    for name, module in modules.items():
+        elapsed, tokens, result = measure(module, query, args.repeat)
+        times[name] = elapsed
+        print(f'{name:<14} {tokens} tokens  {elapsed * 1000:8.2f}ms  {elapsed / tokens * 1e9:7.1f}ns/token  {result}')
+    if args.against:
+        print(f'change {times["working tree"] / times[args.against] - 1:+.1%}')
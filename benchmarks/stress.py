@@ -0,0 +1,57 @@
+"""
+Stress benchmark for the v2 parser on very long inputs.
+
+Parses scripts with many statements, INSERTs with long value lists and WHERE clauses with long
+AND chains at growing sizes, and prints the time per item for each size. The time per item
+should stay flat as the size grows if parsing is linear.
+
+Run from the repository root:
+    python -m benchmarks.stress [--max-size 100000]
+"""
+import argparse
+import time
+
+from sql_parser_v2 import Parser
+
+
+def statements_script(n):
+    return "SELECT users.id FROM users WHERE users.id = 5;\n" * n
+
+
+def long_value_list(n):
+    return 'INSERT INTO users (id) VALUES (' + ', '.join(str(i) for i in range(n)) + ');'
+
+
+def long_condition(n):
+    return 'SELECT * FROM users WHERE ' + ' AND '.join(f'id = {i}' for i in range(n)) + ';'
+
+
+cases = {
+    'statements': statements_script,
+    'value list': long_value_list,
+    'and chain': long_condition,
+}
+
+
+def run(max_size):
+    sizes = []
+    size = 1000
+    while size <= max_size:
+        sizes.append(size)
+        size *= 10
+
+    for name, make_input in cases.items():
+        print(name)
+        for size in sizes:
+            query = make_input(size)
+            start = time.perf_counter()
+            result = Parser(query).parse()
+            elapsed = time.perf_counter() - start
+            print(f'  {size:>9} items  {elapsed:8.3f}s  {elapsed / size * 1e6:7.2f}us/item  {result}')
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--max-size', type=int, default=100000)
+    args = arg_parser.parse_args()
+    run(args.max_size)
@@ -0,0 +1,31 @@
+"""
+The database tables and fields the parsers accept (see assumption 1 in README.md).
+
+Both parsers used to hard-code the users and orders tables. A Catalog holds any schema instead,
+indexed by hash sets so looking up a name costs the same however many tables and fields there are.
+"""
+
+
+class Catalog:
+    def __init__(self, schema=None):
+        # schema maps each table name to its field names
+        self.schema = {}
+        self.tables = set()
+        self.fields = set()
+        for table, fields in (schema or {}).items():
+            self.add_table(table, fields)
+
+    def add_table(self, table, fields=()):
+        self.schema.setdefault(table, set()).update(fields)
+        self.tables.add(table)
+        self.fields.update(fields)
+
+    def __repr__(self):
+        return f'Catalog({len(self.tables)} tables, {len(self.fields)} fields)'
+
+
+# the example database from the grammar in README.md
+default_catalog = Catalog({
+    'users': ['id', 'email', 'first_name', 'last_name'],
+    'orders': ['id', 'user_id', 'date', 'amount'],
+})
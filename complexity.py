@@ -0,0 +1,184 @@
+"""
+Query complexity analysis and limits, to turn pathological queries away before they reach the database.
+
+ComplexityParser is a sql_parser_v2.Parser that measures every statement while it parses it:
+- joins: JOIN clauses;
+- depth: deepest nesting of brackets, in expressions, function calls and the INSERT and SET lists
+  (v2 has no subqueries, so brackets are the only nesting there is);
+- predicates: comparisons, LIKE and IS [NOT] NULL tests, in WHERE, ON and HAVING;
+- aggregates: calls of SUM, AVG, COUNT, MAX and MIN;
+- width: estimated output columns of a SELECT, * counting every field the catalog has for the
+  tables it reads, 0 for the other statements.
+With limits set, parsing stops at the first token that takes a statement over one of them and the
+result holds a ComplexityError at that token. The measures only grow as the parser moves forward, so
+they are checked as each one is counted: a query with a million OR terms costs about as much to
+reject as the first predicates past the limit, and bracket depth is checked before recursing into
+the brackets. The input is still tokenized in full first, which is linear and cheap next to parsing;
+sql_stream.statement_ranges() can cut a script up first to bound that too.
+Recovery mode doesn't resume after a ComplexityError, the result has it after the errors found before it.
+
+    parser = ComplexityParser(query, limits={'joins': 4, 'predicates': 200})
+    result = parser.parse()
+    print(result, parser.statements)
+
+Or over files, printing the measures of each statement:
+    python complexity.py [--limit joins=4 ...] file.sql [...]
+"""
+import argparse
+
+from sql_parser_v2 import Parser, ParseError
+
+measures = ('joins', 'depth', 'predicates', 'aggregates', 'width')
+aggregate_functions = frozenset(['SUM', 'AVG', 'COUNT', 'MAX', 'MIN'])
+
+
+class ComplexityError(ParseError):
+    """
+    A statement went over one of the limits: measure is its name, got the value it reached and limit
+    the limit. span and index are those of the token it was reached at, as for syntax errors.
+    """
+    def __init__(self, measure, got, limit, span, index=None):
+        super().__init__('complexity', span, f'{measure} at most {limit}', got, index)
+        self.measure = measure
+        self.limit = limit
+
+    @property
+    def msg(self):
+        return f'Complexity Error at {self.span}. Expected {self.measure} at most {self.limit}, but Got {self.got}'
+
+    def __repr__(self):
+        return f'ComplexityError({self.measure!r}, {self.got!r}, {self.limit!r}, {self.span!r})'
+
+    def __reduce__(self):
+        return ComplexityError, (self.measure, self.got, self.limit, self.span, self.index)
+
+
+class Complexity:
+    # the measures of one statement
+    __slots__ = measures
+
+    def __init__(self):
+        for measure in measures:
+            setattr(self, measure, 0)
+
+    def as_dict(self):
+        return {measure: getattr(self, measure) for measure in measures}
+
+    def __repr__(self):
+        fields = ', '.join(f'{measure}={getattr(self, measure)}' for measure in measures)
+        return f'Complexity({fields})'
+
+
+class ComplexityParser(Parser):
+    """
+    Parser that fills statements with the Complexity of every statement parsed, in order, and raises
+    a ComplexityError as soon as one goes over limits, a dict of measure -> maximum allowed value.
+    Measures left out of limits, or set to None, aren't limited.
+    """
+    def __init__(self, input, limits=None, **parser_options):
+        super().__init__(input, **parser_options)
+        self.limits = {measure: limit for measure, limit in (limits or {}).items() if limit is not None}
+        unknown = set(self.limits) - set(measures)
+        if unknown:
+            raise ValueError(f'Unknown complexity measures: {", ".join(sorted(unknown))}')
+        self.statements = []
+        self.complexity = Complexity() # of the statement being parsed
+        self.depth = 0 # brackets open at the current token
+        self.star = False # set while parsing a SELECT *, whose tables add their fields to the width
+        self.reading_table = False # set when the next table parsed is one the statement reads from
+
+    def set_tokens(self, tokens):
+        super().set_tokens(tokens)
+        self.statements = []
+
+    def record_error(self, error):
+        # complexity errors end the parse, even when recovering from syntax errors
+        if isinstance(error, ComplexityError):
+            raise error
+        self.depth = 0 # brackets left open by the error don't count for the rest of the statement
+        super().record_error(error)
+
+    def check(self, measure, value):
+        # sets a measure of the current statement and raises if it is over its limit, pointing at the current token
+        setattr(self.complexity, measure, value)
+        limit = self.limits.get(measure)
+        if limit is not None and value > limit:
+            span = self.untokenize_index(min(self.index, self.token_count - 1))
+            raise ComplexityError(measure, value, limit, span, self.index)
+
+    # the rules below count before calling the parser's own, so limits are checked before parsing what went over them
+    def parse_statement(self):
+        self.complexity = Complexity()
+        self.statements.append(self.complexity)
+        self.depth = 0
+        self.star = False
+        self.reading_table = False
+        return super().parse_statement()
+
+    def consume(self, token):
+        if token == '(' and self.peek() == '(':
+            self.depth += 1
+            if self.depth > self.complexity.depth:
+                self.check('depth', self.depth)
+        super().consume(token)
+        if token == ')':
+            self.depth -= 1
+
+    def parse_table_clause(self):
+        self.reading_table = self.star
+        return super().parse_table_clause()
+
+    def parse_join_clause(self):
+        self.check('joins', self.complexity.joins + 1)
+        self.reading_table = self.star
+        return super().parse_join_clause()
+
+    def parse_boolean_expression(self):
+        self.check('predicates', self.complexity.predicates + 1)
+        return super().parse_boolean_expression()
+
+    def parse_function(self):
+        if self.peek() in aggregate_functions:
+            self.check('aggregates', self.complexity.aggregates + 1)
+        return super().parse_function()
+
+    def parse_select_clause(self):
+        self.star = self.peek() == '*'
+        return super().parse_select_clause()
+
+    def parse_field_alias(self):
+        self.check('width', self.complexity.width + 1)
+        return super().parse_field_alias()
+
+    def parse_table(self):
+        # only the FROM and JOIN tables count, not the ones naming a field's table
+        if self.reading_table:
+            self.reading_table = False
+            if self.peek() in self.catalog.tables:
+                self.check('width', self.complexity.width + len(self.catalog.schema.get(self.peek(), ())))
+        return super().parse_table()
+
+
+def parse_limits(values):
+    # ['joins=4', ...] -> {'joins': 4, ...}
+    limits = {}
+    for value in values:
+        measure, _, limit = value.partition('=')
+        limits[measure] = int(limit)
+    return limits
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('paths', nargs='+', help='files to analyze')
+    arg_parser.add_argument('--limit', action='append', default=[], metavar='MEASURE=N', help=f'limit one of: {", ".join(measures)}')
+    args = arg_parser.parse_args()
+
+    limits = parse_limits(args.limit)
+    for path in args.paths:
+        with open(path, encoding='utf-8') as f:
+            parser = ComplexityParser(f.read(), limits=limits)
+        result = parser.parse()
+        print(f'{path}: {result}')
+        for i, complexity in enumerate(parser.statements):
+            print(f'  statement {i + 1}: ' + '  '.join(f'{measure} {value}' for measure, value in complexity.as_dict().items()))
@@ -0,0 +1,259 @@
+"""
+An Earley parser for the grammar of sql_parser.py (v1), building a shared packed parse forest.
+
+v1 returns every end index each rule can reach and tries every alternative from every start, so
+ambiguous or overlapping rules multiply the work. An Earley parser runs the same context-free grammar
+in one left-to-right pass over the tokens. It keeps the set of partially matched rules at each token,
+and at most one copy of each, so any grammar is parsed in O(n^3) time, unambiguous ones in O(n^2)
+and most grammars written for LR/LL parsers, like the one below, in linear time.
+
+parse_forest() follows Scott's "SPPF-style parsing from Earley recognisers" (2008): the result is a
+shared packed parse forest with one node per symbol and span. A node has one family of children per
+way of deriving it, so every parse tree of the input is represented, even exponentially many, in
+cubic space at most. count_trees() and derivation() read it.
+
+The grammar is v1's rules, from README.md, with the right recursion in <condition> and the lists
+made left recursive. It is the same language, but Earley parsing is only linear on left recursion.
+Input is tokenized with the v2 tokenizer, so keywords and identifiers have to be whole words and
+whitespace is allowed between any two tokens. The v1 methods match the characters themselves instead:
+they reject whitespace in some places (around the '.' of users.id, after a function name or inside
+some brackets) and accept keywords run into the next word (OR12), so the two accept slightly
+different sets of strings for the same rules.
+"""
+import math
+
+from catalog import default_catalog
+from ll1 import read_grammar, kind_classes
+from sql_parser_v2 import Parser as TokenizingParser
+
+v1_grammar = read_grammar("""
+<table-field> := <table> . <field> | <field>
+<operator> := + | - | * | / | = | != | < | > | <= | >=
+<function> := SUM | AVG | COUNT | MAX | MIN | UPPER | LOWER
+<term> := <table-field> | <string> | <float> | <integer> | ( <expression> )
+<expression> := <term> | <term> <operator> <term> | <function> ( <expression> ) | <table-field> LIKE <string>
+<condition> := <expression> | <condition> AND <expression> | <condition> OR <expression>
+<field-list> := <table-field> | <field-list> , <table-field>
+<expression-list> := <expression> | <expression-list> , <expression>
+""")
+
+
+class Node:
+    """
+    A node of the parse forest, spanning tokens start to end. label is the symbol for symbol nodes
+    (a terminal for the leaves) or (rule, dot) for the intermediate nodes that binarise longer rules.
+    families holds a tuple of children per derivation: (), (child,) or (left, right).
+    """
+    __slots__ = ('label', 'start', 'end', 'families')
+
+    def __init__(self, label, start, end):
+        self.label = label
+        self.start = start
+        self.end = end
+        self.families = []
+
+    def add_family(self, family):
+        if family not in self.families:
+            self.families.append(family)
+
+    def __repr__(self):
+        return f'Node({self.label!r}, {self.start}, {self.end})'
+
+
+class Grammar:
+    # productions numbered for the parser: rules[i] = (nonterminal, symbols)
+    def __init__(self, productions, start):
+        self.start = start
+        self.rules = [(name, tuple(symbols)) for name, alternatives in productions.items() for symbols in alternatives]
+        self.by_name = {name: [] for name in productions}
+        for i, (name, _) in enumerate(self.rules):
+            self.by_name[name].append(i)
+        if start not in self.by_name:
+            raise ValueError(f'No rules for the start symbol {start}')
+
+
+def parse_forest(grammar, token_classes):
+    """
+    Parses a sequence of tokens, given as the terminals each one can be, and returns the root of the
+    parse forest, or None and the index of the first token that can't continue any parse.
+    """
+    rules, by_name = grammar.rules, grammar.by_name
+    n = len(token_classes)
+
+    def matches(symbol, i):
+        return i < n and symbol not in by_name and symbol in token_classes[i]
+
+    # the items of a set are (rule, dot, origin) mapped to their forest node; pending holds the items of the
+    # current set still to process, scans those that can scan the next token, and waiting[i] the items of
+    # set i by the nonterminal after their dot
+    sets = [{} for _ in range(n + 1)]
+    waiting = [{} for _ in range(n + 1)]
+    next_scans = {}
+    nodes = {} # (label, start, end) -> Node, for the nodes ending at the current position
+
+    def make_node(rule, dot, start, end, left, right):
+        name, symbols = rules[rule]
+        if dot == 1 and dot < len(symbols):
+            return right
+        label = name if dot == len(symbols) else (rule, dot)
+        node = nodes.get((label, start, end))
+        if node is None:
+            node = nodes[label, start, end] = Node(label, start, end)
+        node.add_family((right,) if left is None else (left, right))
+        return node
+
+    def add(item, node, i, items, pending, scans):
+        # adds an item of set i, to be processed or to scan token i
+        rule, dot, origin = item
+        symbols = rules[rule][1]
+        if dot == len(symbols) or symbols[dot] in by_name:
+            if item not in items:
+                items[item] = node
+                pending.append(item)
+                if dot < len(symbols):
+                    waiting[i].setdefault(symbols[dot], []).append(item)
+        elif matches(symbols[dot], i):
+            scans[item] = node
+
+    for rule in by_name[grammar.start]:
+        add((rule, 0, 0), None, 0, sets[0], [], next_scans)
+    pending = list(sets[0])
+
+    for i in range(n + 1):
+        items = sets[i]
+        if i:
+            pending = list(items)
+        scans, next_scans = next_scans, {}
+        completed_empty = {} # nonterminals that derived the empty string at i, with their nodes
+        while pending:
+            item = pending.pop()
+            node = items[item]
+            rule, dot, origin = item
+            name, symbols = rules[rule]
+            if dot < len(symbols):
+                # predict the nonterminal after the dot
+                symbol = symbols[dot]
+                for predicted in by_name[symbol]:
+                    add((predicted, 0, i), None, i, items, pending, scans)
+                if symbol in completed_empty:
+                    advanced = make_node(rule, dot + 1, origin, i, node, completed_empty[symbol])
+                    add((rule, dot + 1, origin), advanced, i, items, pending, scans)
+                continue
+            # complete: advance the items that were waiting for name
+            if node is None: # an empty rule
+                node = nodes.get((name, i, i))
+                if node is None:
+                    node = nodes[name, i, i] = Node(name, i, i)
+                node.add_family(())
+                items[item] = node
+            if origin == i:
+                completed_empty[name] = node
+            for parent in list(waiting[origin].get(name, ())):
+                parent_rule, parent_dot, parent_origin = parent
+                advanced = make_node(parent_rule, parent_dot + 1, parent_origin, i, sets[origin][parent], node)
+                add((parent_rule, parent_dot + 1, parent_origin), advanced, i, items, pending, scans)
+
+        if i == n:
+            break
+        if not scans:
+            return None, i
+        # scan token i
+        nodes = {}
+        leaves = {}
+        for (rule, dot, origin), node in scans.items():
+            terminal = rules[rule][1][dot]
+            leaf = leaves.get(terminal)
+            if leaf is None:
+                leaf = leaves[terminal] = Node(terminal, i, i + 1)
+            advanced = make_node(rule, dot + 1, origin, i + 1, node, leaf)
+            add((rule, dot + 1, origin), advanced, i + 1, sets[i + 1], [], next_scans)
+
+    # the start symbol spanning all the tokens, if the input parsed
+    root = nodes.get((grammar.start, 0, n))
+    return root, None if root is not None else n
+
+
+def count_trees(root):
+    """
+    The number of parse trees the forest below root represents. Derivations that go through a node
+    inside itself, which empty rules can make, are left out, there are infinitely many of those.
+    """
+    counts = {} # node -> count, None while the nodes below it are counted
+    stack = [(root, False)]
+    while stack:
+        node, counted_below = stack.pop()
+        if counted_below:
+            counts[node] = sum(math.prod(counts[child] or 0 for child in family) for family in node.families) if node.families else 1
+            continue
+        if node in counts:
+            continue
+        counts[node] = None
+        stack.append((node, True))
+        for family in node.families:
+            for child in family:
+                if child not in counts:
+                    stack.append((child, False))
+    return counts[root]
+
+
+def derivation(node):
+    """
+    One parse tree from the forest, the first derivation of every node, as nested (symbol, children)
+    tuples with the tokens' (terminal, index) as leaves. Meant for looking at small inputs, it recurses
+    as deep as the tree is.
+    """
+    if not node.families:
+        return (node.label, node.start)
+    return (node.label, tuple(children(node.families[0])))
+
+
+def children(family):
+    # the children of a family, with the intermediate nodes of binarised rules flattened out
+    for child in family:
+        if isinstance(child.label, tuple):
+            yield from children(child.families[0])
+        else:
+            yield derivation(child)
+
+
+class EarleyParser:
+    """
+    Parses like sql_parser.Parser, from <condition> by default, and returns the same messages.
+    forest is the root of the parse forest once parsed. Otherwise error is the index of the token
+    parsing stopped at, or None if the input couldn't be tokenized.
+    """
+    def __init__(self, input, catalog=None, grammar=None, start='<condition>'):
+        self.input = input.strip()
+        self.catalog = catalog if catalog is not None else default_catalog
+        self.grammar = Grammar(grammar if grammar is not None else v1_grammar, start)
+        self.forest = None
+        self.error = None
+
+    def token_classes(self, tokens):
+        # the terminals each token can be
+        classes = []
+        for i in range(len(tokens)):
+            kind = tokens.kinds[i]
+            if kind in kind_classes:
+                classes.append((kind_classes[kind],))
+                continue
+            token = tokens[i]
+            token_classes = (token,)
+            if token in self.catalog.fields:
+                token_classes += ('<field>',)
+            if token in self.catalog.tables:
+                token_classes += ('<table>',)
+            classes.append(token_classes)
+        return classes
+
+    def parse(self):
+        self.forest = None
+        try:
+            tokens = TokenizingParser(self.input).tokenize(self.input)
+        except SyntaxError:
+            self.error = None
+            return 'Incorrect SQL Code'
+        self.forest, self.error = parse_forest(self.grammar, self.token_classes(tokens))
+        if self.forest is None:
+            return 'Incorrect SQL Code'
+        return 'Parse Successful'
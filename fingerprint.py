@@ -0,0 +1,64 @@
+"""
+Query fingerprints: the shape of a query with its literals taken out.
+
+parameterize() replaces string, integer and float literals with placeholders and returns the
+normalized query text together with the literal values. fingerprint() hashes that text into a
+stable 64 bit number, the same across processes and runs, to group queries by shape.
+Both run a single tokenizer pass and don't parse the query.
+"""
+import hashlib
+
+from sql_parser_v2 import Parser, token_pattern, whitespace_pattern, group_kinds, STRING, FLOAT, INT, COMMENT
+
+# placeholders for literals; strings and numbers are kept apart since the grammar doesn't accept one for the other
+string_placeholder = "'?'"
+number_placeholder = '?'
+comment_placeholder = '/*?*/'
+
+
+def parameterize(query):
+    """
+    Returns the normalized query (tokens separated by single spaces, literals and comments replaced by
+    placeholders) and the list of literal values in order: strings without their quotes, ints and floats.
+    Raises the tokenizer's SyntaxError if the query can't be tokenized.
+    """
+    normalized = []
+    literals = []
+    i = 0
+    n = len(query)
+    match_token = token_pattern.match
+    while i < n:
+        match = match_token(query, i)
+        if match is None:
+            if whitespace_pattern.match(query, i).end() == n:
+                break
+            Parser(query).tokenize(query) # raises the tokenization error for this query
+        group = match.lastindex
+        token = match.group(group)
+        kind = group_kinds[group]
+        i = match.end()
+        if kind == STRING:
+            normalized.append(string_placeholder)
+            literals.append(token[1:-1])
+        elif kind == FLOAT:
+            normalized.append(number_placeholder)
+            literals.append(float(token))
+        elif kind == INT:
+            normalized.append(number_placeholder)
+            literals.append(int(token))
+        elif kind == COMMENT:
+            normalized.append(comment_placeholder)
+        else:
+            normalized.append(token)
+    return ' '.join(normalized), literals
+
+
+def hash_text(text):
+    # stable 64 bit hash, unlike hash() which changes between processes
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'big')
+
+
+def fingerprint(query):
+    # returns (64 bit fingerprint of the query's shape, literal values)
+    normalized, literals = parameterize(query)
+    return hash_text(normalized), literals
@@ -0,0 +1,212 @@
+"""
+Incremental re-parsing of a script as it is edited, for editor integration.
+
+The script is kept as a list of segments cut at the statement boundaries sql_stream.Scanner finds
+(after every ';', around every comment), each holding its own text and parsed on its own like
+sql_stream does. An edit only re-scans from the segment before the edited one until the boundaries
+line up with the old ones again, and only the segments in between are re-parsed; the ones after it
+keep their results and syntax trees and are just moved by the length change. A small edit therefore
+costs about as much as parsing the statement it touches, however long the script is.
+
+As with sql_stream, errors are those of parsing each statement on its own: a script is accepted exactly
+when the whole-script parser accepts it, but an error at the very end of a statement is reported at its
+last token rather than at the start of the next statement.
+"""
+from sql_parser_v2 import Parser, ParseResult
+import sql_ast
+from sql_stream import Scanner
+
+# size of the blocks compared at a time by update() when looking for the part of the text that changed
+compare_block = 4096
+
+
+class Segment:
+    __slots__ = ('text', 'offset', 'result', 'tree')
+
+    def __init__(self, text, offset, result, tree):
+        self.text = text
+        self.offset = offset # the start the segment had when it was parsed, error positions are relative to it
+        self.result = result
+        self.tree = tree
+
+
+class IncrementalParser:
+    """
+    Parses text and keeps it parsed through edit() and update().
+    result is the parse result of the current text, tree its syntax tree with build_tree set.
+    build_tree, recover and catalog are as for sql_parser_v2.Parser.
+
+    edit() only touches the segments around the edit. update() takes the whole new text, as editor
+    widgets that don't report edits give it, and has to compare it with the old one first.
+    """
+    def __init__(self, text='', build_tree=False, recover=False, catalog=None):
+        self.build_tree = build_tree
+        self.recover = recover
+        self.catalog = catalog
+        self.length = 0
+        self.joined = '' # the whole text, joined from the segments when asked for
+        self.starts = [] # start of each segment, see start()
+        self.segments = []
+        self.failed = [] # whether each segment has an error
+        self.failures = 0
+        # segments from shift_from on have shift to add to their stored start, so an edit
+        # doesn't have to update every start after it, only the ones since the previous edit
+        self.shift_from = 0
+        self.shift = 0
+        self.result = None
+        self.update(text)
+
+    @property
+    def text(self):
+        if self.joined is None:
+            self.joined = ''.join(segment.text for segment in self.segments)
+        return self.joined
+
+    def start(self, i):
+        # position of segment i in the current text
+        return self.starts[i] + (self.shift if i >= self.shift_from else 0)
+
+    def move_shift(self, i):
+        # makes the pending shift apply from segment i on
+        if i > self.shift_from:
+            for j in range(self.shift_from, i):
+                self.starts[j] += self.shift
+        else:
+            for j in range(i, self.shift_from):
+                self.starts[j] -= self.shift
+        self.shift_from = i
+
+    def find_segment(self, offset):
+        # index of the segment offset is in
+        low, high = 0, len(self.starts)
+        while low < high:
+            middle = (low + high) // 2
+            if self.start(middle) <= offset:
+                low = middle + 1
+            else:
+                high = middle
+        return max(low - 1, 0)
+
+    def update(self, text):
+        # re-parses after the text was replaced by text, as a single edit of the part that changed
+        old = self.text
+        n = min(len(old), len(text))
+        prefix = 0
+        while prefix + compare_block <= n and old[prefix:prefix + compare_block] == text[prefix:prefix + compare_block]:
+            prefix += compare_block
+        while prefix < n and old[prefix] == text[prefix]:
+            prefix += 1
+        n -= prefix
+        suffix = 0
+        while suffix + compare_block <= n and old[len(old) - suffix - compare_block:len(old) - suffix] == text[len(text) - suffix - compare_block:len(text) - suffix]:
+            suffix += compare_block
+        while suffix < n and old[len(old) - suffix - 1] == text[len(text) - suffix - 1]:
+            suffix += 1
+        if prefix == len(old) == len(text) and self.result is not None:
+            return self.result
+        return self.edit(prefix, len(old) - prefix - suffix, text[prefix:len(text) - suffix])
+
+    def edit(self, offset, deleted, inserted):
+        """
+        Replaces deleted characters at offset with the inserted text and re-parses what that changed.
+        Returns the new parse result.
+        """
+        if not 0 <= offset <= offset + deleted <= self.length:
+            raise ValueError(f'Edit of {deleted} characters at {offset} is outside the text of length {self.length}')
+        delta = len(inserted) - deleted
+        edit_end = offset + len(inserted) # end of the edit in the new text
+
+        # re-scan from the start of the segment before the edited one, its boundary may have changed too
+        edited = self.find_segment(offset)
+        first = max(edited - 1, 0)
+        self.move_shift(first)
+        base = self.start(first) if self.segments else 0 # position of buffer[0] in the new text
+
+        # the text of the segments the edit is in, with the edit applied
+        following = first
+        while following < len(self.segments) and self.start(following) < offset + deleted:
+            following += 1
+        buffer = ''.join(segment.text for segment in self.segments[first:following])
+        buffer = buffer[:offset - base] + inserted + buffer[offset - base + deleted:]
+
+        # scan until a boundary falls on the old start of a segment after the edit,
+        # reading the following old segments into the buffer as needed
+        resync = following
+        new_starts = []
+        new_segments = []
+        scanner = Scanner()
+        start = 0
+        while True:
+            boundary = scanner.next_boundary(buffer)
+            if boundary is None:
+                if following < len(self.segments):
+                    # only drop the scanned part once per segment read, not once per statement
+                    buffer = buffer[start:] + self.segments[following].text
+                    following += 1
+                    base += start
+                    scanner.pos -= start
+                    start = 0
+                    continue
+                if start < len(buffer):
+                    new_starts.append(base + start)
+                    new_segments.append(self.parse_segment(buffer[start:], base + start))
+                resync = len(self.segments)
+                break
+            if boundary == start: # a comment right at the start of the segment
+                continue
+            new_starts.append(base + start)
+            new_segments.append(self.parse_segment(buffer[start:boundary], base + start))
+            start = boundary
+            position = base + boundary
+            if position >= edit_end:
+                while resync < len(self.segments) and self.start(resync) + delta < position:
+                    resync += 1
+                if resync < len(self.segments) and self.start(resync) + delta == position:
+                    break # back in step with the old boundaries, the rest is unchanged
+
+        # the segment before the edit usually ends where it did, keep its result
+        if first < edited and new_segments and new_segments[0].text == self.segments[first].text:
+            new_segments[0] = self.segments[first]
+
+        failed = [not segment.result.ok for segment in new_segments]
+        self.failures += failed.count(True) - self.failed[first:resync].count(True)
+        self.starts[first:resync] = new_starts
+        self.segments[first:resync] = new_segments
+        self.failed[first:resync] = failed
+        self.shift_from = first + len(new_segments)
+        self.shift += delta
+        self.length += delta
+        self.joined = None
+        self.result = self.compute_result()
+        return self.result
+
+    def parse_segment(self, statement, start):
+        if not statement.strip(): # whitespace between statements
+            return Segment(statement, start, ParseResult(), sql_ast.Script([]) if self.build_tree else None)
+        parser = Parser(statement, build_tree=self.build_tree, offset=start, recover=self.recover, catalog=self.catalog)
+        return Segment(statement, start, parser.parse(), parser.tree)
+
+    def segment_result(self, i):
+        # the result of segment i, re-parsed if it has moved since, so that error positions are up to date
+        segment = self.segments[i]
+        start = self.start(i)
+        if segment.offset != start:
+            segment = self.segments[i] = self.parse_segment(segment.text, start)
+        return segment.result
+
+    def compute_result(self):
+        if not self.segments or (len(self.segments) == 1 and not self.segments[0].text.strip()):
+            # no statements at all, which the grammar doesn't allow
+            return Parser(self.text, recover=self.recover, catalog=self.catalog).parse()
+        if not self.failures:
+            return ParseResult()
+        if not self.recover:
+            return self.segment_result(self.failed.index(True))
+        return ParseResult([error for i, failed in enumerate(self.failed) if failed for error in self.segment_result(i).errors])
+
+    @property
+    def tree(self):
+        # syntax tree of the whole script when build_tree is set and it parsed
+        if not self.build_tree or not self.result.ok:
+            return None
+        return sql_ast.Script([statement for segment in self.segments for statement in segment.tree.statements])
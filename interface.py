@@ -1,30 +1,29 @@
 from sql_parser_v2 import Parser
+from incremental import IncrementalParser
 import gradio as gr
-import re
 
 def parse_fn(query):
     parser = Parser(query)
     parse_output = parser.parse()
+    return str(parse_output), highlight(query, parse_output)
 
-    if parse_output.startswith('Tokenization'):
-        match = re.search(r"Error at (\d+)", parse_output)
-        if match:
-            start = int(match.group(1))
-            end = len(parse_output) - 1
-    else:      
-        match = re.search(r"Error at \((\d+),\s*(\d+)\)", parse_output)
-        if match:
-            start, end = int(match.group(1)), int(match.group(2))
-        
-            
-    
+def incremental_parse_fn(query, incremental_parser):
+    # re-parses only the statements changed since the last call
+    query = query or ''
+    if incremental_parser is None:
+        incremental_parser = IncrementalParser(query)
+    parse_output = incremental_parser.update(query)
+    return str(parse_output), highlight(query, parse_output), incremental_parser
+
+def highlight(query, parse_output):
+    # marks the characters of every error span
     highlighted_output = []
     for i, q in enumerate(query):
-        if match and start <= i < end:
+        if any(start <= i < end for start, end in (error.span for error in parse_output.errors)):
             highlighted_output.append((q, 'Error'))
         else:
             highlighted_output.append((q, None))
-    return parse_output, highlighted_output
+    return highlighted_output
 
 with gr.Blocks() as demo:
     query = gr.Code(label="SQL Query", language=None, interactive=True)
@@ -32,7 +31,9 @@ with gr.Blocks() as demo:
     parse_btn = gr.Button("Parse")
     highlighted_output_box = gr.HighlightedText(label="Error", combine_adjacent=True, show_legend=True, color_map={"Error": "red"})
     theme=gr.themes.Base()
+    incremental_parser = gr.State(None)
     parse_btn.click(fn=parse_fn, inputs=query, outputs=[output, highlighted_output_box], api_name="parser")
+    query.change(fn=incremental_parse_fn, inputs=[query, incremental_parser], outputs=[output, highlighted_output_box, incremental_parser])
 
 if __name__ == "__main__":
     demo.launch()
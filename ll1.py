@@ -0,0 +1,206 @@
+"""
+A table-driven LL(1) parser generated from the grammar in unambiguous_grammar.md.
+
+read_grammar() turns the rules into productions, first_sets() and follow_sets() compute the FIRST and
+FOLLOW sets and parse_table() builds the predictive table from them: for each nonterminal, the production
+to use for every terminal that can come next. LL1Parser runs that table with an explicit stack instead of
+one method per rule, so every step is a dict lookup, and extending the grammar only means editing the md.
+It accepts the same queries as sql_parser_v2.Parser and reports errors in the same format, but doesn't
+build syntax trees or recover from errors.
+
+Print the table with:
+    python ll1.py [grammar.md]
+"""
+import functools
+import os
+import re
+import sys
+
+from sql_parser_v2 import Parser, STRING, FLOAT, INT, COMMENT
+
+grammar_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'unambiguous_grammar.md')
+
+EMPTY = 'λ'
+END = '$'
+
+# rules for these are descriptions, not productions; they are terminals matched by token kind or by the catalog
+lexical_classes = ['<table>', '<field>', '<string>', '<float>', '<integer>', '<comment>']
+kind_classes = {STRING: '<string>', FLOAT: '<float>', INT: '<integer>', COMMENT: '<comment>'}
+
+# a nonterminal, a bracket, an alternative bar, or a terminal (anything else up to the next one of those)
+symbol_pattern = re.compile(r'<[a-z-]+>|[\[\]|]|(?:(?!<[a-z-]+>)[^\s\[\]|])+')
+
+
+def read_grammar(text):
+    """
+    Returns the productions of the grammar in text (the first ``` block if there is one) as a dict from
+    each nonterminal to its list of alternatives, each a tuple of symbols with () for λ, in rule order.
+    [...] becomes a new nonterminal with a λ alternative, named after the rule it is in.
+    """
+    if '```' in text:
+        text = text.split('```')[1]
+    grammar = {}
+    for line in text.splitlines():
+        line = line.split('//')[0].strip()
+        if not line or line.startswith('#'):
+            continue
+        if ':=' not in line:
+            raise ValueError(f'Grammar rule without := : {line}')
+        name, rule = (part.strip() for part in line.split(':=', 1))
+        if name in lexical_classes:
+            continue
+        symbols = symbol_pattern.findall(rule)
+        alternatives, end = read_alternatives(grammar, name, symbols, 0)
+        if end != len(symbols):
+            raise ValueError(f'Unmatched ] in the rule for {name}')
+        grammar[name] = alternatives
+    return grammar
+
+
+def read_alternatives(grammar, name, symbols, i):
+    # reads alternatives separated by | up to a closing ] or the end, returns them and the index reached
+    alternatives = [[]]
+    while i < len(symbols) and symbols[i] != ']':
+        symbol = symbols[i]
+        if symbol == '|':
+            alternatives.append([])
+        elif symbol == '[':
+            option = f'<{name[1:-1]}-option-{sum(n.startswith(name[:-1] + "-option-") for n in grammar) + 1}>'
+            grammar[option] = None # reserve the name before reading nested options
+            option_alternatives, i = read_alternatives(grammar, name, symbols, i + 1)
+            if i == len(symbols):
+                raise ValueError(f'Unmatched [ in the rule for {name}')
+            grammar[option] = [()] + option_alternatives
+            alternatives[-1].append(option)
+        elif symbol != EMPTY:
+            alternatives[-1].append(symbol)
+        i += 1
+    return [tuple(alternative) for alternative in alternatives], i
+
+
+def first_of(symbols, first, grammar):
+    # FIRST set of a sequence of symbols, with EMPTY in it if they can all derive λ
+    result = set()
+    for symbol in symbols:
+        if symbol not in grammar:
+            result.add(symbol)
+            return result
+        result |= first[symbol] - {EMPTY}
+        if EMPTY not in first[symbol]:
+            return result
+    result.add(EMPTY)
+    return result
+
+
+def first_sets(grammar):
+    first = {name: set() for name in grammar}
+    changed = True
+    while changed:
+        changed = False
+        for name, alternatives in grammar.items():
+            for alternative in alternatives:
+                new = first_of(alternative, first, grammar) - first[name]
+                if new:
+                    first[name] |= new
+                    changed = True
+    return first
+
+
+def follow_sets(grammar, first, start='<sql>'):
+    follow = {name: set() for name in grammar}
+    follow[start].add(END)
+    changed = True
+    while changed:
+        changed = False
+        for name, alternatives in grammar.items():
+            for alternative in alternatives:
+                for i, symbol in enumerate(alternative):
+                    if symbol not in grammar:
+                        continue
+                    rest = first_of(alternative[i + 1:], first, grammar)
+                    new = (rest - {EMPTY}) | (follow[name] if EMPTY in rest else set())
+                    if new - follow[symbol]:
+                        follow[symbol] |= new
+                        changed = True
+    return follow
+
+
+def parse_table(grammar, start='<sql>'):
+    """
+    Returns the predictive parse table: a dict from each nonterminal to a dict from terminal to production.
+    Raises ValueError listing every conflict if the grammar isn't LL(1).
+    """
+    first = first_sets(grammar)
+    follow = follow_sets(grammar, first, start)
+    table = {name: {} for name in grammar}
+    conflicts = []
+    for name, alternatives in grammar.items():
+        for alternative in alternatives:
+            predict = first_of(alternative, first, grammar)
+            if EMPTY in predict:
+                predict = (predict - {EMPTY}) | follow[name]
+            for terminal in sorted(predict):
+                if terminal in table[name] and table[name][terminal] != alternative:
+                    conflicts.append(f'{name} on {terminal}: {table[name][terminal]} or {alternative}')
+                table[name][terminal] = alternative
+    if conflicts:
+        raise ValueError('Grammar is not LL(1):\n' + '\n'.join(conflicts))
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def load_table(path=grammar_path, start='<sql>'):
+    with open(path, encoding='utf-8') as f:
+        return parse_table(read_grammar(f.read()), start)
+
+
+class LL1Parser(Parser):
+    # the v2 parser's tokenizer, error reporting and parse() with parse_sql driven by an LL(1) table
+    def __init__(self, input, offset=0, catalog=None, table=None, start='<sql>'):
+        super().__init__(input, offset=offset, catalog=catalog)
+        self.table = table if table is not None else load_table(start=start)
+        self.start = start
+
+    def token_classes(self, i):
+        # the terminals token i can be, most specific first
+        kind = self.input_kinds[i]
+        if kind in kind_classes:
+            return (kind_classes[kind],)
+        token = self.input[i]
+        classes = (token,)
+        if token in self.catalog.fields:
+            classes += ('<field>',)
+        if token in self.catalog.tables:
+            classes += ('<table>',)
+        return classes
+
+    def parse_sql(self):
+        table = self.table
+        token_classes = [self.token_classes(i) for i in range(len(self.input))] + [(END,)]
+        stack = [self.start]
+        while stack:
+            symbol = stack.pop()
+            classes = token_classes[self.index]
+            row = table.get(symbol)
+            if row is None: # a terminal
+                if symbol in classes:
+                    self.index += 1
+                else:
+                    self.raise_exception(symbol)
+                continue
+            for terminal in classes:
+                production = row.get(terminal)
+                if production is not None:
+                    break
+            else:
+                expected = [terminal for terminal in row if terminal != END]
+                self.raise_exception(expected[0] if len(expected) == 1 else expected)
+            stack.extend(reversed(production))
+
+
+if __name__ == '__main__':
+    table = load_table(sys.argv[1] if len(sys.argv) > 1 else grammar_path)
+    for name, row in table.items():
+        print(name)
+        for terminal, production in row.items():
+            print(f'    {terminal:<12} {" ".join(production) or EMPTY}')
@@ -0,0 +1,137 @@
+"""
+Parallel parsing of a single large script.
+
+Parsing happens in two phases. First, the parent process runs sql_stream.Scanner over the script to
+find statement boundaries, i.e. ';' outside strings and comments, and cuts the script into batches
+of about batch_size at those boundaries. Then a process pool parses the batches, each statement on
+its own with sql_parser_v2, as sql_stream does. Each statement is parsed with its position as the
+parser offset, so the reported errors are positions in the whole script. The
+parent only scans, and it keeps scanning while the workers parse, so the time a large script takes
+goes down with the number of cores.
+
+parse_file() has the workers map the file themselves, so only byte ranges are sent to them and
+error positions are byte offsets. parse_text() sends the text of each batch instead.
+As with sql_stream, a script is accepted exactly when the whole-script parser accepts it.
+
+Run it over a script with:
+    python parallel.py dump.sql [--workers N] [--recover]
+"""
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import os
+import re
+import time
+
+from sql_parser_v2 import Parser, ParseResult
+from sql_stream import Scanner, mapped_file, nonblank_pattern, parse_range, split_statements, statement_ranges
+
+text_nonblank_pattern = re.compile(r'\S')
+
+
+def batch_ranges(buffer, batch_size):
+    # (start, end) ranges covering buffer, each ending at the first statement boundary batch_size or more past its start
+    scanner = Scanner(binary=not isinstance(buffer, str))
+    start = 0
+    while start < len(buffer):
+        boundary = scanner.next_boundary(buffer)
+        while boundary is not None and boundary - start < batch_size:
+            boundary = scanner.next_boundary(buffer)
+        end = len(buffer) if boundary is None else boundary
+        yield start, end
+        start = end
+
+
+def parse_file_batch(path, start, end, parser_options):
+    # runs in a worker process: returns the results of the statements in bytes start to end of the file
+    # that have errors, only the first of them unless recovering
+    failures = []
+    with mapped_file(path) as (mapped, view):
+        for statement_start, statement_end in statement_ranges(mapped, start, end):
+            result = parse_range(view, statement_start, statement_end, parser_options)
+            if not result.ok:
+                failures.append(result)
+                if not parser_options.get('recover'):
+                    break
+    return failures
+
+
+def parse_text_batch(text, offset, parser_options):
+    # parse_file_batch for a batch of text found at offset in the script
+    failures = []
+    for statement_offset, statement in split_statements([text]):
+        result = Parser(statement, offset=offset + statement_offset, **parser_options).parse()
+        if not result.ok:
+            failures.append(result)
+            if not parser_options.get('recover'):
+                break
+    return failures
+
+
+def ordered_results(jobs, workers):
+    # results of jobs, (function, *arguments) tuples, in order; a couple of jobs per worker are submitted at a time
+    if workers == 1:
+        for function, *arguments in jobs:
+            yield function(*arguments)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        try:
+            for function, *arguments in jobs:
+                pending.append(pool.submit(function, *arguments))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            # when the caller stops early, don't parse what is left
+            for future in pending:
+                future.cancel()
+
+
+def combine(jobs, workers, recover):
+    # the result of the script from the failures of its batches: the first failure, or every error when recovering
+    errors = []
+    for failures in ordered_results(jobs, workers or os.cpu_count() or 1):
+        if failures and not recover:
+            return failures[0]
+        for result in failures:
+            errors.extend(result.errors)
+    return ParseResult(errors)
+
+
+def parse_file(path, workers=None, batch_size=1 << 22, **parser_options):
+    """
+    Parses the SQL file at path in parallel, in batches of about batch_size bytes, and returns the parse result.
+    workers defaults to the number of cores. parser_options are passed on to sql_parser_v2.Parser;
+    build_tree isn't supported since the trees would have to be sent back from the workers.
+    """
+    with mapped_file(path) as (mapped, view):
+        if nonblank_pattern.search(mapped) is None: # blank, the error for it is the whole-input parser's
+            return Parser(mapped[:], **parser_options).parse()
+        jobs = ((parse_file_batch, path, start, end, parser_options) for start, end in batch_ranges(mapped, batch_size))
+        return combine(jobs, workers, parser_options.get('recover', False))
+
+
+def parse_text(text, workers=None, batch_size=1 << 22, **parser_options):
+    # parse_file for a script already in memory; batch_size is in characters and error positions are too
+    if text_nonblank_pattern.search(text) is None:
+        return Parser(text, **parser_options).parse()
+    jobs = ((parse_text_batch, text[start:end], start, parser_options) for start, end in batch_ranges(text, batch_size))
+    return combine(jobs, workers, parser_options.get('recover', False))
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('path')
+    arg_parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per cpu)')
+    arg_parser.add_argument('--batch-size', type=int, default=1 << 22, help='bytes per batch')
+    arg_parser.add_argument('--recover', action='store_true', help='report every error, not just the first')
+    args = arg_parser.parse_args()
+
+    started = time.perf_counter()
+    result = parse_file(args.path, args.workers, args.batch_size, recover=args.recover)
+    elapsed = time.perf_counter() - started
+    print(result)
+    size = os.path.getsize(args.path)
+    print(f'{size} bytes in {elapsed:.2f}s, {size / elapsed / (1 << 20):.1f} MiB/s')
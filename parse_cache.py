@@ -0,0 +1,133 @@
+"""
+A bounded LRU cache of parse results for services that validate the same query shapes over and over.
+
+Queries are cached by their shape: the normalized text from fingerprint.parameterize, with whitespace
+dropped and every literal replaced by a placeholder. A repeated shape skips parsing entirely; only that
+one tokenizer pass runs. Errors are cached as the token index and expected tokens, and the error is
+rebuilt for the query being checked, so positions and the offending token are always those of that query.
+"""
+from collections import OrderedDict
+import sys
+import threading
+import time
+
+from fingerprint import parameterize
+from sql_parser_v2 import Parser, ParseError, ParseResult
+
+
+def entry_size(key, result):
+    # bytes taken by a cache entry: the key, and the result or the error with its span, expected tokens and token,
+    # counted as if the expected lists weren't shared with the parser
+    size = sys.getsizeof(key) + sys.getsizeof(result)
+    if isinstance(result, ParseError):
+        size += sys.getsizeof(vars(result)) + sys.getsizeof(result.span) + sys.getsizeof(result.got)
+        expected = result.expected
+        size += sys.getsizeof(expected)
+        if isinstance(expected, list):
+            size += sum(sys.getsizeof(token) for token in expected)
+    else:
+        size += sys.getsizeof(result.errors)
+    return size
+
+
+class ParseCache:
+    """
+    Parse results for at most maxsize query shapes, and at most max_bytes of keys and cached results if given.
+    With ttl set, entries older than ttl seconds are parsed again.
+    hits, misses, evictions and expirations count what happened to each lookup.
+    """
+    def __init__(self, maxsize=1024, ttl=None, max_bytes=None, catalog=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.catalog = catalog
+        self.clock = clock
+        self.entries = OrderedDict() # normalized query -> (result, expiry time, size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lock = threading.Lock()
+
+    def parse(self, query):
+        # same result as Parser(query, catalog=catalog).parse()
+        try:
+            key, literals = parameterize(query)
+        except SyntaxError as e:
+            # no token stream to key on
+            with self.lock:
+                self.misses += 1
+            return ParseResult([e])
+
+        result = self.lookup(key)
+        if isinstance(result, ParseResult): # parsed, cached as its result
+            return result
+
+        parser = Parser(query, catalog=self.catalog)
+        tokens = parser.tokenize(query)
+        if result is None:
+            result = parser.parse_tokens(tokens)
+            self.store(key, result if result.ok else parser.error)
+            return result
+
+        # rebuild the cached error for this query's tokens
+        parser.set_tokens(tokens)
+        parser.index = result.index
+        try:
+            parser.raise_exception(result.expected)
+        except ParseError as e:
+            return ParseResult([e])
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            result, expires, size = entry
+            if expires is not None and self.clock() >= expires:
+                self.remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def store(self, key, result):
+        size = entry_size(key, result)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires = self.clock() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (result, expires, size)
+            self.size += size
+            while len(self.entries) > self.maxsize or (self.max_bytes is not None and self.size > self.max_bytes):
+                oldest = next(iter(self.entries))
+                self.remove(oldest)
+                self.evictions += 1
+
+    def remove(self, key):
+        result, expires, size = self.entries.pop(key)
+        self.size -= size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,157 @@
+"""
+Opt-in per-rule profiling for sql_parser.py (v1) and sql_parser_v2.py (v2).
+
+Profiler.attach(parser) wraps the parse_* methods of one parser object, the grammar rules, so that
+every call records:
+- calls: how often the rule was called;
+- failures: calls that matched nothing, an empty index list in v1 or a raised error in v2;
+- repeats: calls at a position the rule was already tried at on that parser, i.e. work redone
+  while backtracking (answered from the memo in v1 with packrat);
+- total: cumulative time in the rule and everything it called, recursive calls counted once;
+- self: total minus the time spent in other rules.
+Time is also recorded per call stack, so write_collapsed() can give a collapsed-stack file for
+flamegraph.pl or speedscope. Only attached objects are wrapped and the classes are never touched, so
+parsers that aren't profiled run exactly as before.
+
+    profiler = Profiler()
+    profiler.attach(Parser(query)).parse()
+    print(profiler.report())
+
+Or over files, a generated script by default:
+    python profiling.py [--v1] [--recover] [--collapsed out.folded] [file.sql ...]
+"""
+import argparse
+import time
+
+import sql_parser
+import sql_parser_v2
+
+
+class RuleStats:
+    __slots__ = ('calls', 'failures', 'repeats', 'total', 'self', 'active')
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self.repeats = 0
+        self.total = 0.0
+        self.self = 0.0
+        self.active = 0 # calls of the rule in progress, time is only added to total by the outermost one
+
+
+class Profiler:
+    def __init__(self, prefix='parse_'):
+        self.prefix = prefix # methods with this prefix are grammar rules
+        self.rules = {} # rule -> RuleStats
+        self.stacks = {} # 'rule;rule;...' -> self time of that call stack
+        self.stack = [] # rules being called
+        self.child_times = [] # time spent in the rules called by each of them
+
+    def attach(self, parser):
+        # wraps the rules of parser and returns it
+        empty_fails = isinstance(parser, sql_parser.Parser) # v1 rules return the indices they reach
+        tried = set()
+        for name in dir(type(parser)):
+            if name.startswith(self.prefix) and callable(getattr(type(parser), name)):
+                setattr(parser, name, self.wrap(parser, name, getattr(parser, name), empty_fails, tried))
+        return parser
+
+    def detach(self, parser):
+        # unwraps the rules of parser and returns it
+        for name, value in list(vars(parser).items()):
+            if name.startswith(self.prefix) and hasattr(value, '__wrapped__'):
+                delattr(parser, name)
+        return parser
+
+    def wrap(self, parser, name, method, empty_fails, tried):
+        stats = self.rules.setdefault(name, RuleStats())
+        stack, child_times, stacks = self.stack, self.child_times, self.stacks
+        clock = time.perf_counter
+
+        def profiled(*args, **kwargs):
+            position = args[0] if args else getattr(parser, 'index', None)
+            stats.calls += 1
+            if (name, position) in tried:
+                stats.repeats += 1
+            else:
+                tried.add((name, position))
+            stack.append(name)
+            child_times.append(0.0)
+            stats.active += 1
+            failed = True
+            start = clock()
+            try:
+                result = method(*args, **kwargs)
+                failed = empty_fails and not result
+                return result
+            finally:
+                elapsed = clock() - start
+                own = elapsed - child_times.pop()
+                key = ';'.join(stack)
+                stacks[key] = stacks.get(key, 0.0) + own
+                stack.pop()
+                if child_times:
+                    child_times[-1] += elapsed
+                stats.active -= 1
+                if not stats.active:
+                    stats.total += elapsed
+                stats.self += own
+                stats.failures += failed
+
+        profiled.__name__ = name
+        profiled.__wrapped__ = method
+        return profiled
+
+    def reset(self):
+        self.rules.clear()
+        self.stacks.clear()
+
+    def report(self, limit=None):
+        # a table of the rules that were called, by self time
+        rows = sorted((item for item in self.rules.items() if item[1].calls), key=lambda item: item[1].self, reverse=True)
+        width = max([len(name) for name, _ in rows] + [4])
+        lines = [f"{'rule':<{width}}  {'calls':>9}  {'failures':>9}  {'repeats':>9}  {'total ms':>10}  {'self ms':>10}"]
+        for name, stats in rows[:limit]:
+            lines.append(
+                f'{name:<{width}}  {stats.calls:>9}  {stats.failures:>9}  {stats.repeats:>9}'
+                f'  {stats.total * 1000:>10.2f}  {stats.self * 1000:>10.2f}'
+            )
+        return '\n'.join(lines)
+
+    def write_collapsed(self, path):
+        # one 'rule;rule;... microseconds' line per call stack
+        with open(path, 'w') as f:
+            for key, seconds in sorted(self.stacks.items()):
+                microseconds = round(seconds * 1e6)
+                if microseconds:
+                    f.write(f'{key} {microseconds}\n')
+
+
+if __name__ == '__main__':
+    from benchmarks import generate
+
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('paths', nargs='*', help='files to parse, a generated input by default')
+    arg_parser.add_argument('--v1', action='store_true', help='profile sql_parser.py, which only parses conditions')
+    arg_parser.add_argument('--recover', action='store_true', help='v2 error recovery')
+    arg_parser.add_argument('--limit', type=int, default=None, help='rules to show')
+    arg_parser.add_argument('--collapsed', help='write collapsed stacks to this file')
+    args = arg_parser.parse_args()
+
+    inputs = []
+    for path in args.paths:
+        with open(path, encoding='utf-8') as f:
+            inputs.append(f.read())
+    if not inputs:
+        inputs = [generate.condition(50, 2) if args.v1 else generate.script(1000)]
+
+    profiler = Profiler()
+    for text in inputs:
+        if args.v1:
+            parser = sql_parser.Parser(text)
+        else:
+            parser = sql_parser_v2.Parser(text, recover=args.recover)
+        print(profiler.attach(parser).parse())
+    print(profiler.report(args.limit))
+    if args.collapsed:
+        profiler.write_collapsed(args.collapsed)
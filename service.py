@@ -0,0 +1,312 @@
+"""
+An asyncio HTTP validation service, separate from the Gradio interface.
+
+POST /parse takes a JSON batch, {"queries": [...], "recover": false, "schema": {table: [fields]},
+"limits": {measure: n}} with only "queries" required, and answers {"results": [...]} with the parse
+result of every query: {"ok": true}, or {"ok": false, "errors": [...]} with the kind, span, expected
+and got of each error.
+Batches are parsed in a process pool so the event loop stays free. At most max_pending batches are
+parsed or waiting at a time; past that the service answers 503 straight away instead of queueing
+without bound, so clients can back off. A batch that fails in a worker is answered with 500, and a
+pool broken by a worker dying is replaced. GET /stats gives request counts and latency percentiles of
+the most recent requests. With "limits", queries are parsed with complexity.ComplexityParser and
+those going over a limit get a "complexity" error, so pathological queries are turned away cheaply.
+
+Only the standard library is used. Run the service and a load generator against it with:
+    python service.py serve [--port 8444] [--workers N] [--max-pending 64]
+    python service.py load [--port 8444] [--requests 1000] [--concurrency 16] [--batch-size 10]
+"""
+import argparse
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import json
+import multiprocessing
+import os
+import time
+
+from catalog import Catalog
+from complexity import ComplexityParser, measures
+from sql_parser_v2 import Parser
+
+max_body = 1 << 20 # bytes
+max_batch = 10000 # queries
+latency_window = 10000 # latencies kept for the percentiles
+
+reasons = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+    500: 'Internal Server Error', 503: 'Service Unavailable',
+}
+
+
+class BadRequest(ValueError):
+    # a request that isn't valid HTTP, answered with 400 before the connection is closed
+    pass
+
+
+def new_pool(workers):
+    # workers are started from a fresh process, not forked from this one, where they would inherit every client
+    # socket open at the time and keep those connections open after the service has closed them
+    context = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+
+def parse_batch(queries, recover=False, schema=None, limits=None):
+    # runs in a worker process
+    catalog = Catalog(schema) if schema is not None else None
+    if limits:
+        return [result_json(ComplexityParser(query, limits, recover=recover, catalog=catalog).parse()) for query in queries]
+    return [result_json(Parser(query, recover=recover, catalog=catalog).parse()) for query in queries]
+
+
+def result_json(result):
+    if result.ok:
+        return {'ok': True}
+    return {'ok': False, 'errors': [
+        {'kind': error.kind, 'span': error.span, 'expected': error.expected, 'got': error.got}
+        for error in result.errors
+    ]}
+
+
+def percentiles(values, points=(50, 90, 99)):
+    # nearest-rank percentiles of values, and the maximum
+    if not values:
+        return {}
+    values = sorted(values)
+    result = {f'p{point}': values[max(0, -(-point * len(values) // 100) - 1)] for point in points}
+    result['max'] = values[-1]
+    return result
+
+
+class Service:
+    def __init__(self, workers=None, max_pending=64):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = new_pool(self.workers)
+        self.max_pending = max_pending
+        self.pending = 0
+        self.latencies = deque(maxlen=latency_window)
+        self.requests = 0
+        self.queries = 0
+        self.rejected = 0
+        self.errors = 0
+
+    async def handle_connection(self, reader, writer):
+        # HTTP/1.1 with keep-alive, one request at a time per connection
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except BadRequest as e:
+                    self.errors += 1
+                    write_response(writer, 400, {'error': str(e)}, keep_alive=False)
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, response = await self.handle_request(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                write_response(writer, status, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, method, path, body):
+        if path == '/stats':
+            return 200, self.stats()
+        if path != '/parse':
+            return 404, {'error': f'No such path {path}'}
+        if method != 'POST':
+            return 405, {'error': 'Use POST'}
+        if body is None:
+            return 413, {'error': f'Request bodies are limited to {max_body} bytes'}
+
+        started = time.perf_counter()
+        self.requests += 1
+        try:
+            batch = json.loads(body)
+            queries = batch['queries']
+            if not isinstance(queries, list) or not all(isinstance(query, str) for query in queries):
+                raise ValueError('queries must be a list of strings')
+            if len(queries) > max_batch:
+                raise ValueError(f'Batches are limited to {max_batch} queries')
+            schema = batch.get('schema')
+            if schema is not None and not (isinstance(schema, dict) and all(
+                isinstance(fields, list) and all(isinstance(field, str) for field in fields) for fields in schema.values()
+            )):
+                raise ValueError('schema must map table names to lists of field names')
+            recover = batch.get('recover', False)
+            if not isinstance(recover, bool):
+                raise ValueError('recover must be true or false')
+            limits = batch.get('limits') or {}
+            if not all(measure in measures and type(limit) is int and limit >= 0 for measure, limit in limits.items()):
+                raise ValueError(f'limits must map some of {", ".join(measures)} to non-negative integers')
+            options = {'recover': recover, 'schema': schema, 'limits': limits}
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.errors += 1
+            return 400, {'error': f'Expected {{"queries": [...]}}: {e}'}
+
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return 503, {'error': 'Too many pending batches, retry later'}
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self.pool, parse_batch, queries, options['recover'], options['schema'], options['limits'])
+        except Exception as e:
+            # a failure in the worker, or the pool itself broken by a worker dying; answer rather than drop the connection
+            self.errors += 1
+            if isinstance(e, BrokenProcessPool):
+                self.pool = new_pool(self.workers)
+            return 500, {'error': f'Parsing failed: {type(e).__name__}: {e}'}
+        finally:
+            self.pending -= 1
+        self.queries += len(queries)
+        self.latencies.append(time.perf_counter() - started)
+        return 200, {'results': results}
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'queries': self.queries,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'pending': self.pending,
+            'latency_seconds': percentiles(self.latencies),
+        }
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f'Serving on http://{host}:{port}')
+        async with server:
+            await server.serve_forever()
+
+
+async def read_request(reader):
+    # returns (method, path, headers, body) or None at the end of the connection; body is None if it is too large
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode('latin-1').split()
+    if len(parts) != 3:
+        raise BadRequest('Malformed request line')
+    method, path, version = parts
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, colon, value = line.decode('latin-1').partition(':')
+        if not colon:
+            raise BadRequest('Malformed header line')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise BadRequest('Content-Length must be an integer') from None
+    if length < 0:
+        raise BadRequest('Content-Length must not be negative')
+    if length > max_body:
+        return method, path, {'connection': 'close'}, None
+    body = await reader.readexactly(length) if length else b''
+    return method, path, headers, body
+
+
+def write_response(writer, status, response, keep_alive=True):
+    body = json.dumps(response).encode()
+    writer.write(
+        f'HTTP/1.1 {status} {reasons[status]}\r\n'
+        f'Content-Type: application/json\r\n'
+        f'Content-Length: {len(body)}\r\n'
+        f'Connection: {"keep-alive" if keep_alive else "close"}\r\n'
+        f'\r\n'.encode() + body
+    )
+
+
+# load generator
+async def post(reader, writer, host, path, payload):
+    body = json.dumps(payload).encode()
+    writer.write(
+        f'POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, value = line.decode('latin-1').split(':', 1)
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def load(host, port, requests, concurrency, batch_size):
+    """
+    Sends requests batches of batch_size queries from concurrency connections at once and
+    prints the throughput, client-side latency percentiles and the service's own /stats.
+    """
+    queries = [
+        'SELECT users.id, users.email FROM users WHERE users.id > 5 AND users.email LIKE \'%@x.com\';',
+        'INSERT INTO orders (user_id, amount) VALUES (1, 9.99);',
+        'DELETE FROM orders WHERE amount < 10;',
+        'SELECT * FROM;',
+    ]
+    payload = {'queries': [queries[i % len(queries)] for i in range(batch_size)]}
+    latencies = []
+    statuses = {}
+    remaining = [requests]
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                started = time.perf_counter()
+                status, response = await post(reader, writer, host, '/parse', payload)
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    print(f'{requests} requests of {batch_size} queries in {elapsed:.2f}s: '
+          f'{requests / elapsed:.0f} requests/s, {statuses.get(200, 0) * batch_size / elapsed:.0f} queries/s')
+    print('statuses', statuses)
+    print('client latency', {name: f'{value * 1000:.1f}ms' for name, value in percentiles(latencies).items()})
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f'GET /stats HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode())
+    response = await reader.read()
+    writer.close()
+    print('service stats', response.split(b'\r\n\r\n', 1)[1].decode())
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = arg_parser.add_subparsers(dest='command', required=True)
+    serve_args = commands.add_parser('serve', help='run the service')
+    serve_args.add_argument('--host', default='127.0.0.1')
+    serve_args.add_argument('--port', type=int, default=8444)
+    serve_args.add_argument('--workers', type=int, default=None, help='worker processes (default: one per cpu)')
+    serve_args.add_argument('--max-pending', type=int, default=64, help='batches parsed or queued before answering 503')
+    load_args = commands.add_parser('load', help='send load to a running service')
+    load_args.add_argument('--host', default='127.0.0.1')
+    load_args.add_argument('--port', type=int, default=8444)
+    load_args.add_argument('--requests', type=int, default=1000)
+    load_args.add_argument('--concurrency', type=int, default=16)
+    load_args.add_argument('--batch-size', type=int, default=10)
+    args = arg_parser.parse_args()
+
+    if args.command == 'serve':
+        asyncio.run(Service(args.workers, args.max_pending).serve(args.host, args.port))
+    else:
+        asyncio.run(load(args.host, args.port, args.requests, args.concurrency, args.batch_size))
@@ -0,0 +1,184 @@
+"""
+Syntax tree nodes built by sql_parser_v2.Parser when it is created with build_tree=True.
+
+Nodes only keep what the grammar in unambiguous_grammar.md can express. Names (tables, fields,
+functions, operators) are kept as the token text, literals keep their token text and kind,
+and aliases are stored without the surrounding quotes.
+"""
+
+
+class Node:
+    __slots__ = ()
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def children(self):
+        # direct child nodes, in source order
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if isinstance(value, Node):
+                yield value
+            elif isinstance(value, list):
+                for item in value:
+                    if isinstance(item, Node):
+                        yield item
+
+
+# big picture sql
+class Script(Node):
+    __slots__ = ('statements',)
+
+    def __init__(self, statements):
+        self.statements = statements
+
+
+class Comment(Node):
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+# queries
+class Select(Node):
+    __slots__ = ('distinct', 'columns', 'table', 'joins', 'where', 'group_by', 'having', 'order_by')
+
+    def __init__(self, distinct, columns, table, joins, where=None, group_by=None, having=None, order_by=None):
+        self.distinct = distinct
+        self.columns = columns
+        self.table = table
+        self.joins = joins
+        self.where = where
+        self.group_by = group_by
+        self.having = having
+        self.order_by = order_by
+
+
+class Insert(Node):
+    __slots__ = ('table', 'fields', 'values')
+
+    def __init__(self, table, fields, values):
+        self.table = table
+        self.fields = fields
+        self.values = values
+
+
+class Update(Node):
+    __slots__ = ('table', 'assignments', 'where')
+
+    def __init__(self, table, assignments, where=None):
+        self.table = table
+        self.assignments = assignments
+        self.where = where
+
+
+class Delete(Node):
+    __slots__ = ('table', 'where')
+
+    def __init__(self, table, where=None):
+        self.table = table
+        self.where = where
+
+
+# query helpers
+class Star(Node):
+    __slots__ = ()
+
+
+class Column(Node):
+    # <field-alias>
+    __slots__ = ('expression', 'alias')
+
+    def __init__(self, expression, alias=None):
+        self.expression = expression
+        self.alias = alias
+
+
+class TableAlias(Node):
+    __slots__ = ('table', 'alias')
+
+    def __init__(self, table, alias=None):
+        self.table = table
+        self.alias = alias
+
+
+class Join(Node):
+    __slots__ = ('join_type', 'table', 'condition')
+
+    def __init__(self, join_type, table, condition):
+        self.join_type = join_type
+        self.table = table
+        self.condition = condition
+
+
+class Assignment(Node):
+    __slots__ = ('field', 'value')
+
+    def __init__(self, field, value):
+        self.field = field
+        self.value = value
+
+
+class OrderItem(Node):
+    __slots__ = ('field', 'direction')
+
+    def __init__(self, field, direction=None):
+        self.field = field
+        self.direction = direction
+
+
+# expressions
+class TableField(Node):
+    __slots__ = ('table', 'field')
+
+    def __init__(self, table, field):
+        self.table = table
+        self.field = field
+
+
+class Literal(Node):
+    # kind is one of 'string', 'float' or 'integer'
+    __slots__ = ('kind', 'text')
+
+    def __init__(self, kind, text):
+        self.kind = kind
+        self.text = text
+
+
+class FunctionCall(Node):
+    __slots__ = ('name', 'argument')
+
+    def __init__(self, name, argument):
+        self.name = name
+        self.argument = argument
+
+
+class BinaryOp(Node):
+    # math operators, comparison operators, AND and OR
+    __slots__ = ('operator', 'left', 'right')
+
+    def __init__(self, operator, left, right):
+        self.operator = operator
+        self.left = left
+        self.right = right
+
+
+class Like(Node):
+    __slots__ = ('field', 'pattern')
+
+    def __init__(self, field, pattern):
+        self.field = field
+        self.pattern = pattern
+
+
+class IsNull(Node):
+    __slots__ = ('field', 'negated')
+
+    def __init__(self, field, negated=False):
+        self.field = field
+        self.negated = negated
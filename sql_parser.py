@@ -1,5 +1,8 @@
+import functools
 import re
 
+from catalog import default_catalog
+
 def flatten_and_reduce(lst):
     flattened = []
     for item in lst:
@@ -11,30 +14,33 @@ def flatten_and_reduce(lst):
             flattened.append(item)
     return list(set(flattened))
 
+def memoize(func):
+    """
+    Packrat memoization for a parse function: the legal indices reachable from a
+    given start index never change during a parse, so each (rule, index) pair is only
+    computed once. Callers modify the returned lists in place, so copies are handed out.
+    """
+    name = func.__name__
 
+    @functools.wraps(func)
+    def wrapper(self, index):
+        if not self.packrat:
+            return func(self, index)
+        key = (name, index)
+        if key not in self.memo:
+            self.memo[key] = func(self, index)
+        return list(self.memo[key])
 
-# def log_function_call(func):
-#     log_function_call.depth = 0
+    return wrapper
 
-#     def wrapper(*args, **kwargs):
-#         indent = ' ' * 4 * log_function_call.depth
-#         print(f"{indent}Calling function: {func.__name__}")
-#         log_function_call.depth += 1
-#         result = func(*args, **kwargs)
-#         log_function_call.depth -= 1
-#         return result
+non_whitespace_pattern = re.compile(r'\S')
+identifier_pattern = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+string_pattern = re.compile(r"'(.*?)'")
+integer_pattern = re.compile(r"\d+")
+float_pattern = re.compile(r"\d+\.\d+")
 
-#     return wrapper
 
-# def decorate_all_methods(decorator):
-#     def decorate(cls):
-#         for attr in cls.__dict__:
-#             if callable(getattr(cls, attr)):
-#                 setattr(cls, attr, decorator(getattr(cls, attr)))
-#         return cls
-#     return decorate
 
-# @decorate_all_methods(log_function_call)
 class Parser:
     """
     Each parse function should be defined:
@@ -42,16 +48,29 @@ class Parser:
     - index (int) : a valid index you want to start searching from
     Return:
     - indices (Arr[int]) : an array of integers that contain legal inidices
-    
+
+    With packrat=True (the default) every rule's result is cached per start index
+    (see memoize), so shared sub-parses are not repeated while backtracking.
+
+    engine='earley' runs the same grammar rules with earley.EarleyParser instead of these methods,
+    in linear time on the conditions the methods parse and without running out of stack. It reads
+    tokens from the v2 tokenizer, though, so the input is split differently: it allows whitespace
+    between any two tokens (users . id, COUNT ( id ), ( ( id ) )), which these methods reject in
+    some places, and it needs keywords to be whole words, where these methods accept OR12 as OR 12.
     """
-    def __init__(self, input):
+    def __init__(self, input, packrat=True, catalog=None, engine='backtrack'):
+        if engine not in ('backtrack', 'earley'):
+            raise ValueError(f"engine must be 'backtrack' or 'earley', not {engine!r}")
         self.input = input.strip()
+        self.catalog = catalog if catalog is not None else default_catalog
+        self.packrat = packrat
+        self.engine = engine
+        self.memo = {}
 
     def skip_whitespace(self, index):
-        pattern = r'\S'
-        match = re.search(pattern, self.input[index:])
+        match = non_whitespace_pattern.search(self.input, index)
         if match:
-            return index + match.end() - 1
+            return match.start()
         else:
             return None
 
@@ -61,44 +80,45 @@ class Parser:
         return flatten_and_reduce(indices)
 
     def parse(self):
+        if self.engine == 'earley':
+            import earley # only loaded, with the v2 tokenizer, when the engine is used
+            return earley.EarleyParser(self.input, self.catalog).parse()
+        self.memo = {}
         parse_result = self.parse_condition(0)
         if not parse_result or len(self.input) not in parse_result:
             return f'Incorrect SQL Code'
         else: 
             return f'Parse Successful'
 
+    @memoize
     def parse_table(self, index):
         """
-        <table> := users | orders
+        <table> := **any table in the catalog**
         """
         if index > len(self.input):
             return []
         
-        tables = ['users', 'orders']
-        indices = []
-        for table in tables:
-            if self.input[index:].startswith(table):
-                indices.append(index + len(table))
-            else:
-                indices.append(None)
-        return flatten_and_reduce(indices)
+        match = identifier_pattern.match(self.input, index)
+        if match and match.group() in self.catalog.tables:
+            return [match.end()]
+        else:
+            return []
 
+    @memoize
     def parse_field(self, index):
         """
-        <field> := id | email | first_name | last_name | user_id | date | amount
+        <field> := **any field in the catalog**
         """
         if index > len(self.input):
             return []
         
-        fields = ['id', 'email', 'first_name', 'last_name', 'user_id', 'date', 'amount']
-        indices = []
-        for field in fields:
-            if self.input[index:].startswith(field):
-                indices.append(index + len(field))
-            else:
-                indices.append(None)
-        return flatten_and_reduce(indices)
+        match = identifier_pattern.match(self.input, index)
+        if match and match.group() in self.catalog.fields:
+            return [match.end()]
+        else:
+            return []
     
+    @memoize
     def parse_table_field(self, index):
         """
         <table-field> := <table>.<field> | <field>
@@ -119,7 +139,7 @@ class Parser:
         indices = self.parse_table(index)
         
         for i in range(len(indices)):
-            if self.input[indices[i]:].startswith('.'):
+            if self.input.startswith('.', indices[i]):
                 indices[i] += 1
             else:
                 indices[i] = None
@@ -133,6 +153,7 @@ class Parser:
     def parse_table_field_2(self, index):
         return flatten_and_reduce(self.parse_field(index))
         
+    @memoize
     def parse_string(self, index):
         """
         <string> := **all legal strings in between single qoutes**
@@ -140,14 +161,16 @@ class Parser:
         if index > len(self.input):
             return []
         index = self.skip_whitespace(index)
-        pattern = r"^'(.*?)'"
-        match = re.search(pattern, self.input[index:])
+        if index is None:
+            return []
+        match = string_pattern.match(self.input, index)
 
         if match:
-            return [index + match.end()]
+            return [match.end()]
         else:
             return []
     
+    @memoize
     def parse_integer(self, index):
         """
         <integer> := **all legal integers**
@@ -155,14 +178,16 @@ class Parser:
         if index > len(self.input):
             return []
         index = self.skip_whitespace(index)
-        pattern = r"^\d+"
-        match = re.search(pattern, self.input[index:])
+        if index is None:
+            return []
+        match = integer_pattern.match(self.input, index)
 
         if match:
-            return [index + match.end()]
+            return [match.end()]
         else:
             return []
 
+    @memoize
     def parse_float(self, index):
         """
         <float> := **all legal floats of the form XX.XX**
@@ -170,14 +195,16 @@ class Parser:
         if index > len(self.input):
             return []
         index = self.skip_whitespace(index)
-        pattern = r"^\d+\.\d+"
-        match = re.search(pattern, self.input[index:])
+        if index is None:
+            return []
+        match = float_pattern.match(self.input, index)
 
         if match:
-            return [index + match.end()]
+            return [match.end()]
         else:
             return []
     
+    @memoize
     def parse_alias(self, index):
         """
         <alias> := <string>
@@ -187,6 +214,7 @@ class Parser:
             return []
         return flatten_and_reduce(self.parse_string(index))
     
+    @memoize
     def parse_operator(self, index):
         """
         <operator> := + | - | * | / | = | != | < | > | <= | >= 
@@ -199,12 +227,13 @@ class Parser:
         operators = ['+', '-', '*', '/', '=', '!=', '<', '>', '<=', '>=']
         indices = []
         for operator in operators:
-            if self.input[index:].startswith(operator):
+            if self.input.startswith(operator, index):
                 indices.append(index + len(operator))
             else:
                 indices.append(None)
         return flatten_and_reduce(indices)
     
+    @memoize
     def parse_function(self, index):
         """
         <function> := SUM | AVG | COUNT | MAX | MIN | UPPER | LOWER
@@ -217,12 +246,13 @@ class Parser:
         functions = ['SUM', 'AVG', 'COUNT', 'MAX', 'MIN', 'UPPER', 'LOWER']
         indices = []
         for function in functions:
-            if self.input[index:].startswith(function):
+            if self.input.startswith(function, index):
                 indices.append(index + len(function))
             else:
                 indices.append(None)
         return flatten_and_reduce(indices)
     
+    @memoize
     def parse_term(self, index):
         """
         <term> := <table-field> | <string> | <integer> | <float> | (<expression>)
@@ -255,7 +285,7 @@ class Parser:
         return self.parse_integer(index)
     
     def parse_term_5(self, index):        
-        if self.input[index:].startswith('('):
+        if self.input.startswith('(', index):
             index += 1
         else:
             return []
@@ -268,13 +298,14 @@ class Parser:
         indices = self.skip_whitespaces(indices)
         
         for i in range(len(indices)):
-            if self.input[indices[i]:].startswith(')'):
+            if self.input.startswith(')', indices[i]):
                 indices[i] += 1
             else:
                 indices[i] = None
         
         return flatten_and_reduce(indices)
 
+    @memoize
     def parse_expression(self, index):
         """
         <expression> := <term> | <term> <operator> <term> | <function> ( <expression> ) | <table-field> LIKE <string> | ( <select-query> )
@@ -316,7 +347,7 @@ class Parser:
         indices = self.skip_whitespaces(indices)
 
         for i in range(len(indices)):
-            if self.input[indices[i]:].startswith('('):
+            if self.input.startswith('(', indices[i]):
                 indices[i] += 1
             else:
                 indices[i] = None
@@ -327,7 +358,7 @@ class Parser:
         indices = flatten_and_reduce(indices)
 
         for i in range(len(indices)):
-            if self.input[indices[i]:].startswith(')'):
+            if self.input.startswith(')', indices[i]):
                 indices[i] += 1
             else:
                 indices[i] = None
@@ -339,7 +370,7 @@ class Parser:
         indices = self.skip_whitespaces(indices)
         
         for i in range(len(indices)):
-            if self.input[indices[i]:].startswith('LIKE'):
+            if self.input.startswith('LIKE', indices[i]):
                 indices[i] += 4
             else:
                 indices[i] = None
@@ -354,6 +385,7 @@ class Parser:
         # TODO
         return flatten_and_reduce([])
 
+    @memoize
     def parse_condition(self, index):
         """
         <condition> = <expression> | <expression> AND <condition> | <expression> OR <condition>
@@ -379,7 +411,7 @@ class Parser:
         indices = self.skip_whitespaces(indices)
         
         for i in range(len(indices)):
-            if self.input[indices[i]:].startswith('AND'):
+            if self.input.startswith('AND', indices[i]):
                 indices[i] += 3
             else:
                 indices[i] = None
@@ -395,7 +427,7 @@ class Parser:
         indices = self.skip_whitespaces(indices)
         
         for i in range(len(indices)):
-            if self.input[indices[i]:].startswith('OR'):
+            if self.input.startswith('OR', indices[i]):
                 indices[i] += 3
             else:
                 indices[i] = None
@@ -410,6 +442,7 @@ class Parser:
 
 
 
+    @memoize
     def parse_field_list(self, index):
 
         if index > len(self.input):
@@ -439,7 +472,7 @@ class Parser:
         
         # ,
         for i in range(len(indices)):
-            if self.input[indices[i]:].startswith(','):
+            if self.input.startswith(',', indices[i]):
                 indices[i] += 1
             else:
                 indices[i] = None
@@ -457,6 +490,7 @@ class Parser:
 
 
 
+    @memoize
     def parse_expression_list(self, index):
 
         if index > len(self.input):
@@ -485,7 +519,7 @@ class Parser:
         
         # ,
         for i in range(len(indices)):
-            if self.input[indices[i]:].startswith(','):
+            if self.input.startswith(',', indices[i]):
                 indices[i] += 1
             else:
                 indices[i] = None
@@ -502,6 +536,7 @@ class Parser:
 
 
 
+    @memoize
     def parse_select_clause(self, index):
 
         if index > len(self.input):
@@ -522,7 +557,7 @@ class Parser:
 
         # *
         indices = []
-        if self.input[index:].startswith('*'):
+        if self.input.startswith('*', index):
             indices.append(index + 1)
         else:
             indices.append(None)
@@ -537,6 +572,7 @@ class Parser:
 
 
 
+    @memoize
     def parse_field_alias_list(self, index):
 
         if index > len(self.input):
@@ -567,7 +603,7 @@ class Parser:
 
         # ,
         for i in range(len(indices)):
-            if self.input[indices[i]:].startswith(','):
+            if self.input.startswith(',', indices[i]):
                 indices[i] += 1
             else:
                 indices[i] = None
@@ -583,6 +619,7 @@ class Parser:
 
 
 
+    @memoize
     def parse_field_alias(self, index):
 
         if index > len(self.input):
@@ -613,7 +650,7 @@ class Parser:
 
         # as
         for i in range(len(indices)):
-            if self.input[indices[i]:].startswith('as'):
+            if self.input.startswith('as', indices[i]):
                 indices[i] += 2
             else:
                 indices[i] = None
@@ -631,6 +668,7 @@ class Parser:
 
 
 
+    @memoize
     def parse_table_alias_list(self, index):
 
         if index > len(self.input):
@@ -661,7 +699,7 @@ class Parser:
 
         # ,
         for i in range(len(indices)):
-            if self.input[indices[i]:].startswith(','):
+            if self.input.startswith(',', indices[i]):
                 indices[i] += 1
             else:
                 indices[i] = None
@@ -677,6 +715,7 @@ class Parser:
 
 
 
+    @memoize
     def parse_table_alias(self, index):
 
         if index > len(self.input):
@@ -706,7 +745,7 @@ class Parser:
 
         # as
         for i in range(len(indices)):
-            if self.input[indices[i]:].startswith('as'):
+            if self.input.startswith('as', indices[i]):
                 indices[i] += 2
             else:
                 indices[i] = None
@@ -1,78 +1,281 @@
-from collections import defaultdict
+from array import array
 import re
 
+import sql_ast
+from catalog import default_catalog
+
 keyword_list = [
     ',', '.', ';', 'SELECT', 'DISTINCT', 'FROM', 'WHERE', 'GROUP', 'BY', 'HAVING', 'ORDER', 'DELETE', 'UPDATE', 'SET', 'INSERT', 'INTO', 'VALUES',
     'ASC', 'DESC', 'RIGHT', 'LEFT', 'INNER', 'FULL', 'JOIN', 'ON', 'AS', 
     'SUM', 'AVG', 'COUNT', 'MAX', 'MIN', 'UPPER', 'LOWER', 'ROUND', 'LENGTH', 'ABS', 'AND', 'OR', 'LIKE', 'IS', 'NOT', 'NULL', 
-    'users', 'orders', 'id', 'email', 'first_name', 'last_name', 'user_id', 'date', 'amount',
     '<=', '>=', '!=', '+', '-', '*', '/', '=', '<', '>', '(', ')'
 ]
 
-keywords = defaultdict(set)
-for k in keyword_list:
-    keywords[len(k)].add(k)
+
+def trie_pattern(words):
+    # a regex matching the longest of words at a position, with their common prefixes factored out as in a trie,
+    # so it takes one step per character matched however many words there are: ['<', '<='] gives <=?
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {} # a word ends here
+    return trie_node_pattern(trie)
+
+
+def trie_node_pattern(node):
+    chars = sorted(char for char in node if char)
+    leaves = [re.escape(char) for char in chars if list(node[char]) == ['']]
+    branches = [re.escape(char) + trie_node_pattern(node[char]) for char in chars if list(node[char]) != ['']]
+    if len(leaves) > 1:
+        leaves = ['[' + ''.join(leaves) + ']']
+    if len(branches) + len(leaves) > 1:
+        pattern = '(?:' + '|'.join(branches + leaves) + ')'
+    elif branches:
+        pattern = branches[0] if '' not in node else f'(?:{branches[0]})'
+    else:
+        pattern = leaves[0] # a single character or class
+    # a shorter word ends here, so the rest is optional, and greedy so the longest word wins
+    return pattern + '?' if '' in node else pattern
+
+
+# one pattern for every token class, tried in the same order as the old per-class searches:
+# string, float (before int since they overlap), integer, comment, words, then the other keywords longest first.
+# words are keywords as well as table and field names, which are looked up in the parser's catalog
+# (whole words only, so users_archive is never split at the keyword-like prefix)
+token_pattern = re.compile(
+    r"\s*(?:"
+    r"('[^'\n]*')"
+    r"|(\d+\.\d+)"
+    r"|(\d+)"
+    r"|(/\*.*?\*/)"
+    r"|([A-Za-z_][A-Za-z0-9_]*)"
+    r"|(" + trie_pattern(k for k in keyword_list if not k[0].isalpha()) + r")"
+    r")",
+    re.DOTALL,
+)
+whitespace_pattern = re.compile(r'\s*')
+# the same for bytes-like input (bytes, mmap, memoryview), where \s and \d only match ascii
+binary_token_pattern = re.compile(token_pattern.pattern.encode(), re.DOTALL)
+binary_whitespace_pattern = re.compile(rb'\s*')
+
+# token kinds, set once by the tokenizer so the parse methods can branch on them without any regex
+STRING, INT, FLOAT, KEYWORD, IDENT, OP, COMMENT = range(7)
+# kind of the token matched by each group of token_pattern; words are then split into KEYWORD and IDENT
+group_kinds = (None, STRING, FLOAT, INT, COMMENT, IDENT, OP)
+word_keywords = frozenset(k for k in keyword_list if k[0].isalpha())
+# keyword tokens are stored as their index in keyword_list, the text of any other token is sliced from the source
+keyword_codes = {k: code for code, k in enumerate(keyword_list)}
+binary_keyword_codes = {k.encode(): code for code, k in enumerate(keyword_list)}
+NO_CODE = 255
+
+# used to resynchronize after a syntax error in recovery mode
+statement_keywords = ['SELECT', 'INSERT', 'UPDATE', 'DELETE']
+clause_keywords = {
+    'SELECT': ['FROM', 'WHERE', 'GROUP', 'HAVING', 'ORDER'],
+    'UPDATE': ['WHERE'],
+    'DELETE': ['WHERE'],
+}
+
+# the tokens the parse methods branch on: the lists keep the order expected tokens are reported in,
+# the frozensets are for the membership tests
+functions = ['UPPER', 'LOWER', 'ROUND', 'LENGTH', 'ABS', 'SUM', 'AVG', 'COUNT', 'MAX', 'MIN']
+comparison_operators = ['<=', '>=', '!=', '=', '<', '>']
+join_types = ['RIGHT', 'LEFT', 'INNER', 'FULL']
+function_set = frozenset(functions)
+comparison_operator_set = frozenset(comparison_operators)
+join_type_set = frozenset(join_types)
+predicate_keywords = frozenset(['LIKE', 'IS']) # after a <table-field>, these make a boolean expression a LIKE or IS test
+order_directions = frozenset(['ASC', 'DESC'])
+value_kinds = frozenset([STRING, FLOAT, INT])
+# binding power of the binary operators in math expressions and conditions, higher binds tighter
+math_powers = {'+': 1, '-': 1, '*': 2, '/': 2}
+condition_powers = {'OR': 1, 'AND': 2}
+# the method parsing what starts with a given token, or token kind for values
+statement_methods = {'SELECT': 'parse_select_query', 'INSERT': 'parse_insert_query', 'UPDATE': 'parse_update_query', 'DELETE': 'parse_delete_query'}
+value_methods = {STRING: 'parse_string', FLOAT: 'parse_float', INT: 'parse_integer'}
+
+class ParseError(SyntaxError):
+    """
+    A syntax or tokenization error: kind is 'syntax' or 'tokenization', span the (start, end) position
+    of the error in the input, expected the token or list of tokens expected there, got the token found
+    instead (None at the end of the input) and index the token index the parser was at.
+    The message is only formatted when it is asked for, most rejected input never needs it.
+    """
+    def __init__(self, kind, span, expected=None, got=None, index=None):
+        super().__init__()
+        self.kind = kind
+        self.span = span
+        self.expected = expected
+        self.got = got
+        self.index = index
+
+    @property
+    def msg(self):
+        if self.kind == 'tokenization':
+            return f'Tokenization Error at {self.span[0]}. Expected: {self.expected}'
+        return f'Syntax Error at {self.span}. Expected {self.expected}, but Got {self.got}'
+
+    def __str__(self):
+        return self.msg
+
+    def __repr__(self):
+        return f'ParseError({self.kind!r}, {self.span!r}, {self.expected!r}, {self.got!r})'
+
+    def __reduce__(self):
+        # exceptions are pickled from their args, which this one doesn't use
+        return ParseError, (self.kind, self.span, self.expected, self.got, self.index)
+
+
+class ParseResult:
+    """
+    What Parser.parse() returns. ok is set if the input parsed, otherwise errors holds the ParseErrors found
+    (more than one only in recovery mode) and kind, span, expected and got are those of the first one.
+    str() gives the old message: 'Parsed', or the error messages one per line.
+    """
+    __slots__ = ('errors',)
+
+    def __init__(self, errors=()):
+        self.errors = tuple(errors)
+        for error in self.errors:
+            # results outlive the parser, the tracebacks would keep its frames and tokens alive
+            error.__traceback__ = None
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    @property
+    def error(self):
+        return self.errors[0] if self.errors else None
+
+    @property
+    def kind(self):
+        return self.errors[0].kind if self.errors else None
+
+    @property
+    def span(self):
+        return self.errors[0].span if self.errors else None
+
+    @property
+    def expected(self):
+        return self.errors[0].expected if self.errors else None
+
+    @property
+    def got(self):
+        return self.errors[0].got if self.errors else None
+
+    def __str__(self):
+        if not self.errors:
+            return 'Parsed'
+        return '\n'.join(error.msg for error in self.errors)
+
+    def __eq__(self, other):
+        # equal when the errors are, for comparing results from different parsers or processes
+        if not isinstance(other, ParseResult):
+            return NotImplemented
+        fields = lambda result: [(error.kind, error.span, error.expected, error.got) for error in result.errors]
+        return fields(self) == fields(other)
+
+    def __repr__(self):
+        return f'ParseResult({list(self.errors)!r})'
+
+
+class TokenStream:
+    """
+    The tokens of a source text as offsets into it: starts and ends are arrays of unsigned ints ('Q' for
+    sources of 4 GiB or more), kinds a bytearray of token kinds and codes a bytearray of keyword codes, so a
+    token takes 10 bytes rather than a string and a tuple. Indexing returns the token text: the shared
+    keyword_list string for keywords, otherwise a slice of the source made only when it's asked for,
+    decoded from utf-8 if the source is bytes-like.
+    """
+    __slots__ = ('source', 'binary', 'starts', 'ends', 'kinds', 'codes')
+
+    def __init__(self, source):
+        typecode = 'I' if len(source) < 1 << 32 else 'Q'
+        self.source = source
+        self.binary = not isinstance(source, str)
+        self.starts = array(typecode)
+        self.ends = array(typecode)
+        self.kinds = bytearray()
+        self.codes = bytearray()
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, i):
+        code = self.codes[i]
+        if code != NO_CODE:
+            return keyword_list[code]
+        if self.binary:
+            return str(self.source[self.starts[i]:self.ends[i]], 'utf-8', 'replace')
+        return self.source[self.starts[i]:self.ends[i]]
+
+    def span(self, i):
+        # (start, end) of token i in the source
+        return self.starts[i], self.ends[i]
+
 
 class Parser:
-    def __init__(self, input):
+    def __init__(self, input, build_tree=False, offset=0, recover=False, catalog=None):
         self.string_input = input
-        self.input = []
-        self.input_index_map = []
-        self.index = 0
+        self.catalog = catalog if catalog is not None else default_catalog # the tables and fields that can be used
+        self.set_tokens(TokenStream(''))
+        self.offset = offset # position of input in a larger text, added to every reported error position
+        self.build_tree = build_tree # set to keep the syntax tree of the input in self.tree after parse()
+        self.tree = None
+        self.recover = recover # set to keep parsing after an error and collect every error in self.errors
+        self.errors = []
+        self.error = None # the error that stopped the last parse
 
     def tokenize(self, input):
-        tokenized_input = []
-        index_map = []
+        # returns the TokenStream of input, a str or a bytes-like object whose positions are then byte offsets
+        tokens = TokenStream(input)
+        add_start, add_end, add_kind, add_code = tokens.starts.append, tokens.ends.append, tokens.kinds.append, tokens.codes.append
         i = 0
-        while i < len(input):
-            i = self.skip_whitespace(input, i)
-            token = None
-            substring = input[i:]
-
-            # string
-            match = re.search(r"^'(.*?)'", substring)
-            if not token and match:
-                token = substring[match.start():match.end()]
-
-            # float - its important to do this before int
-            match = re.search(r"^\d+\.\d+", substring)
-            if not token and match:
-                token = substring[match.start():match.end()]
-
-            # integer
-            match = re.search(r"^\d+", substring)
-            if not token and match:
-                token = substring[match.start():match.end()]
-
-            # multi-line comments
-            match = re.search(r"^/\*.*?\*/", substring, re.DOTALL)
-            if not token and match:
-                token = substring[match.start():match.end()]
-
-            if not token:    
-                for l in sorted(keywords.keys(), reverse=True):
-                    if substring[:l] in keywords[l]:
-                        token = substring[:l]
-                        break
-            
-            if token is not None:
-                tokenized_input.append(token)
-                index_map.append((i, i + len(token)))
-                i += len(token)
-            elif substring.strip() == '': # check for empty string
-                break
-            else:
-                raise SyntaxError(f'Tokenization Error at {i}. Expected: {["<string>", "<float>", "<integer>", "<comment>", "<token>"]}')
+        n = len(input)
+        if tokens.binary:
+            match_token, codes = binary_token_pattern.match, binary_keyword_codes
+        else:
+            match_token, codes = token_pattern.match, keyword_codes
+        while i < n:
+            match = match_token(input, i)
+            if match is None:
+                i = self.skip_whitespace(input, i)
+                if i == n: # only whitespace left
+                    break
+                error = ParseError('tokenization', (i + self.offset, i + self.offset + 1), ["<string>", "<float>", "<integer>", "<comment>", "<token>"])
+                if not self.recover:
+                    raise error
+                # skip everything up to the next position a token can start at
+                start = i
+                while i < n and match_token(input, i) is None:
+                    i += 1
+                error.span = (start + self.offset, i + self.offset)
+                self.errors.append(error)
+                continue
+
+            group = match.lastindex
+            start = match.start(group)
+            i = match.end()
+            kind = group_kinds[group]
+            code = NO_CODE
+            if kind == IDENT or kind == OP:
+                code = codes.get(match.group(group), NO_CODE)
+                if code != NO_CODE and kind == IDENT:
+                    kind = KEYWORD
+            add_start(start)
+            add_end(i)
+            add_kind(kind)
+            add_code(code)
         
-        return tokenized_input, index_map
+        return tokens
     
     def skip_whitespace(self, input, i):
-        pattern = r'\S'
-        match = re.search(pattern, input[i:])
-        if match:
-            return i + match.end() - 1
-        else:
-            return i
+        if isinstance(input, str):
+            return whitespace_pattern.match(input, i).end()
+        return binary_whitespace_pattern.match(input, i).end()
         
     def consume(self, token):
         try:
@@ -83,20 +286,35 @@ class Parser:
         except IndexError as e:
             raise self.raise_exception(token, len(self.input - 1), 'None') # TODO: fix the length calculation here
 
+    def set_tokens(self, tokens):
+        self.input = tokens # the TokenStream being parsed
+        self.input_kinds = tokens.kinds # kind of each token in self.input
+        self.token_count = len(tokens)
+        self.index = 0
+        self.peeked = -1 # index of the token in self.token, which is only made once per position
+        self.token = None
+
     def peek(self):
-        if self.index < len(self.input):
-            return self.input[self.index]
+        index = self.index
+        if index != self.peeked:
+            self.peeked = index
+            self.token = self.input[index] if index < self.token_count else None
+        return self.token
+
+    def peek_kind(self):
+        if self.index < self.token_count:
+            return self.input_kinds[self.index]
         else:
             return None
     
     def look_ahead(self):
-        if self.index + 1 < len(self.input):
+        if self.index + 1 < self.token_count:
             return self.input[self.index + 1]
         else: 
             return None
 
     def look_ahead_n(self, n):
-        if self.index + n < len(self.input):
+        if self.index + n < self.token_count:
             return self.input[self.index + n]
         else: 
             return None
@@ -104,390 +322,558 @@ class Parser:
 
     def untokenize_index(self, i):
         # this turns a n index for the token array into an index for the original string
-        return self.input_index_map[i]
+        start, end = self.input.span(i)
+        return (start + self.offset, end + self.offset)
 
     def raise_exception(self, expected, i = None, got = None):
         # i = token index
         if i is None:
-            i = min(self.index, len(self.input) - 1)
-        i = self.untokenize_index(i)
-        error_stmt = f'Syntax Error at {i}. Expected {expected}, but Got {got if got else self.peek()}'
-        raise SyntaxError(error_stmt)
+            i = min(self.index, self.token_count - 1)
+        if i < 0: # no tokens at all, point at the end of the input
+            end = len(self.string_input) + self.offset
+            i = (end, end)
+        else:
+            i = self.untokenize_index(i)
+        raise ParseError('syntax', i, expected, got if got else self.peek(), self.index)
 
     def parse(self):
+        self.errors = []
+        self.error = None
         try:
-            self.input, self.input_index_map = self.tokenize(self.string_input)
-            self.parse_sql()
-            if self.index == len(self.input):
-                return 'Parsed'
-            else:
+            tokens = self.tokenize(self.string_input)
+        except SyntaxError as e:
+            self.tree = None
+            self.error = e
+            return ParseResult([e])
+        return self.parse_tokens(tokens)
+
+    def parse_tokens(self, tokens):
+        # parse() for input that has already been tokenized with self.tokenize
+        self.set_tokens(tokens)
+        try:
+            self.tree = self.parse_sql()
+            if self.index != self.token_count:
                 self.raise_exception('<longer input>')
+            if self.errors: # only in recovery mode
+                self.tree = None
+                self.errors.sort(key=lambda error: error.span)
+                return ParseResult(self.errors)
+            return ParseResult()
         except SyntaxError as e:
-            return e.msg
+            self.tree = None
+            self.error = e
+            if self.recover: # keep the errors recorded before the one that stopped the parse
+                self.errors.append(e)
+                self.errors.sort(key=lambda error: error.span)
+                return ParseResult(self.errors)
+            return ParseResult([e])
+
+    # error recovery
+    def recover_statement(self):
+        # parse_statement for recovery mode: a syntax error is recorded and parsing resumes
+        # at the next clause keyword of the statement, or at the next statement
+        start = self.index
+        statement_type = self.peek()
+        try:
+            return self.parse_statement()
+        except ParseError as error:
+            self.record_error(error)
+
+        if self.index == start and self.index < self.token_count: # the statement didn't even start, make sure we move on
+            self.index += 1
+        keyword = self.synchronize(clause_keywords.get(statement_type, []))
+        while keyword is not None:
+            try:
+                self.resume_statement(statement_type, keyword)
+                return None
+            except ParseError as error:
+                self.record_error(error)
+            keyword = self.synchronize(clause_keywords.get(statement_type, []))
+        return None
+
+    def record_error(self, error):
+        self.errors.append(error)
+
+    def synchronize(self, keywords):
+        # skips tokens up to one of the given clause keywords and returns it,
+        # or returns None at the end of the statement (after its ';' or before the next statement)
+        while self.peek() is not None:
+            token = self.peek()
+            if token == ';':
+                self.consume(';')
+                return None
+            if token in statement_keywords or self.peek_kind() == COMMENT:
+                return None
+            if token in keywords:
+                return token
+            self.index += 1
+        return None
+
+    def resume_statement(self, statement_type, keyword):
+        # parses the rest of a statement starting at one of its clause keywords
+        if keyword == 'FROM':
+            self.consume('FROM')
+            self.parse_table_clause()
+        if statement_type == 'SELECT':
+            self.parse_select_tail()
+        else:
+            self.consume('WHERE')
+            self.parse_condition()
+        self.consume(';')
+
+    # every parse_* method below returns its syntax tree node (see sql_ast.py) when build_tree is set
+    # and None otherwise; the table, field, function and operator methods always return the token they consumed
 
     # databas tables & fields
     def parse_table(self):
-        tables = ['users', 'orders']
-        if self.peek() in tables:    
-            self.consume(self.peek())
+        table = self.peek()
+        if table in self.catalog.tables:    
+            self.consume(table)
         else:
-            self.raise_exception(tables)
+            self.raise_exception('<table>')
+        return table
 
     def parse_field(self):
-        fields = ['id', 'email', 'first_name', 'last_name', 'user_id', 'date', 'amount']
-        if self.peek() in fields:    
-            self.consume(self.peek())
+        field = self.peek()
+        if field in self.catalog.fields:    
+            self.consume(field)
         else:
-            self.raise_exception(fields)
+            self.raise_exception('<field>')
+        return field
         
     def parse_table_field(self):
-        fields = ['id', 'email', 'first_name', 'last_name', 'user_id', 'date', 'amount']
-        if self.peek() in fields:
-            self.parse_field()
+        if self.peek() in self.catalog.fields:
+            table = None
+            field = self.parse_field()
         else:
-            self.parse_table()
+            table = self.parse_table()
             self.consume('.')
-            self.parse_field()
+            field = self.parse_field()
+        if self.build_tree:
+            return sql_ast.TableField(table, field)
         
     # basic definitions
     def parse_string(self):
-        match = re.search(r"^'[^']*'$", self.peek())
-        if match:
-            self.consume(self.peek())
+        string = self.peek()
+        if self.peek_kind() == STRING:
+            self.consume(string)
         else:
             self.raise_exception('<string>')
+        if self.build_tree:
+            return sql_ast.Literal('string', string)
         
     def parse_float(self):
-        match = re.search(r"^\d+\.\d+$", self.peek())
-        if match:
-            self.consume(self.peek())
+        number = self.peek()
+        if self.peek_kind() == FLOAT:
+            self.consume(number)
         else:
             self.raise_exception('<float>')
+        if self.build_tree:
+            return sql_ast.Literal('float', number)
 
     def parse_integer(self):
-        match = re.search(r"^\d+$", self.peek())
-        if match:
-            self.consume(self.peek())
+        number = self.peek()
+        if self.peek_kind() == INT:
+            self.consume(number)
         else:
             self.raise_exception('<float>')
+        if self.build_tree:
+            return sql_ast.Literal('integer', number)
 
     def parse_value(self):
-        if self.peek() is not None and re.search(r"^'[^']*'$", self.peek()):
-            self.parse_string()
-        elif self.peek() is not None and re.search(r"^\d+\.\d+$", self.peek()): # important that float be done first since it overlaps with integer definition
-            self.parse_float()
-        elif self.peek() is not None and  re.search(r"^\d+$", self.peek()):
-            self.parse_integer()
-        else:
+        method = value_methods.get(self.peek_kind())
+        if method is None:
             self.raise_exception(['<string>', '<float>', '<integer>'])
+        return getattr(self, method)()
 
     def parse_alias(self):
-        self.parse_string()
+        string = self.parse_string()
+        if self.build_tree:
+            return string.text[1:-1]
 
     def parse_function(self):
-        functions = ['UPPER', 'LOWER', 'ROUND', 'LENGTH', 'ABS', 'SUM', 'AVG', 'COUNT', 'MAX', 'MIN']
-        if self.peek() in functions:
-             self.consume(self.peek())
+        function = self.peek()
+        if function in function_set:
+             self.consume(function)
         else:
             self.raise_exception(functions)
+        return function
     
-    def parse_math_operator(self):
-        math_operators = ['+', '-', '*', '/']
-        if self.peek() in math_operators:
-             self.consume(self.peek())
-        else:
-            self.raise_exception(math_operators)
-        
     def parse_comparison_operator(self):
-        comparison_operators = ['<=', '>=', '!=', '=', '<', '>']
-        if self.peek() in comparison_operators:
-             self.consume(self.peek())
+        operator = self.peek()
+        if operator in comparison_operator_set:
+             self.consume(operator)
         else:
             self.raise_exception(comparison_operators)
+        return operator
 
     def parse_term(self):
         if self.peek() == '(':
             self.consume('(')
-            self.parse_math_expression()
+            expression = self.parse_math_expression()
             self.consume(')')
-        elif self.peek() is not None and (re.search(r"^'[^']*'$", self.peek()) or re.search(r"^\d+\.\d+$", self.peek()) or re.search(r"^\d+$", self.peek())):
-            self.parse_value()
+            return expression
+        elif self.peek_kind() in value_kinds:
+            return self.parse_value()
         else:
-            self.parse_table_field()
+            return self.parse_table_field()
         
     def parse_math_expression(self):
-        functions = ['UPPER', 'LOWER', 'ROUND', 'LENGTH', 'ABS', 'SUM', 'AVG', 'COUNT', 'MAX', 'MIN']
-        math_operators = ['+', '-', '*', '/']
-        if self.peek() in functions:
-            self.parse_function()
+        if self.peek() in function_set:
+            function = self.parse_function()
             self.consume('(')
-            self.parse_math_expression()
+            argument = self.parse_math_expression()
             self.consume(')')
+            if self.build_tree:
+                return sql_ast.FunctionCall(function, argument)
         else:
-            self.parse_term()
-            if self.peek() in math_operators: # optional part
-                self.parse_optional_math_clause()
-
-    def parse_optional_math_clause(self):
-        math_operators = ['+', '-', '*', '/']
-        self.parse_math_operator() 
-        self.parse_term()
-        if self.peek() in math_operators: # optional part
-            self.parse_optional_math_clause()
+            term = self.parse_term()
+            if self.peek() in math_powers: # optional part
+                return self.parse_optional_math_clause(term)
+            return term
+
+    def parse_optional_math_clause(self, left=None):
+        # left is the expression parsed so far; * and / bind tighter than + and -
+        return self.parse_operator_chain(left, self.parse_term, math_powers)
+
+    def parse_operator_chain(self, left, parse_operand, powers, min_power=1):
+        """
+        Pratt-style parsing of the operators in powers and their operands after left, all left associative.
+        Returns the tree with the tighter binding operators lower down. It only recurses when an operator
+        binds tighter than the one before it, so at most once per level and never once per operator.
+        """
+        operator = self.peek()
+        power = powers.get(operator)
+        while power is not None and power >= min_power:
+            self.index += 1 # the operator just peeked
+            right = parse_operand()
+            next_operator = self.peek()
+            next_power = powers.get(next_operator)
+            if next_power is not None and next_power > power: # the next operator takes right as its left operand
+                right = self.parse_operator_chain(right, parse_operand, powers, power + 1)
+                next_operator = self.peek()
+                next_power = powers.get(next_operator)
+            if self.build_tree:
+                left = sql_ast.BinaryOp(operator, left, right)
+            operator, power = next_operator, next_power
+        return left
 
     def parse_boolean_expression(self):
-        tables = ['users', 'orders']
-        fields = ['id', 'email', 'first_name', 'last_name', 'user_id', 'date', 'amount']
-        if (self.peek() in fields and self.look_ahead() in ['LIKE', 'IS']) or \
-           (self.peek() in tables and self.look_ahead() == '.' and self.look_ahead_n(2) in fields and self.look_ahead_n(3) in ['LIKE', 'IS']): # look-ahead for <table-field> followed by LIKE or IS
-            self.parse_table_field()
+        # look-ahead for <table-field> followed by LIKE or IS, checking the token after the first one
+        # first as that rules out most comparisons in one probe
+        token, next_token = self.peek(), self.look_ahead()
+        if (next_token in predicate_keywords and token in self.catalog.fields) or \
+           (next_token == '.' and self.look_ahead_n(3) in predicate_keywords and token in self.catalog.tables and self.look_ahead_n(2) in self.catalog.fields):
+            field = self.parse_table_field()
             if self.peek() == 'LIKE':
                 self.consume('LIKE')
-                self.parse_string()
+                pattern = self.parse_string()
+                if self.build_tree:
+                    return sql_ast.Like(field, pattern)
             elif self.peek() == 'IS':
                 self.consume('IS')
+                negated = False
                 if self.peek() == 'NOT': # optional
                     self.consume('NOT')
+                    negated = True
                 self.consume('NULL')
+                if self.build_tree:
+                    return sql_ast.IsNull(field, negated)
             else:
                 self.raise_exception(['LIKE <string>', 'IS [NOT] NULL'])
         else:
-            self.parse_math_expression()
-            self.parse_comparison_operator()
-            self.parse_math_expression()
+            left = self.parse_math_expression()
+            operator = self.parse_comparison_operator()
+            right = self.parse_math_expression()
+            if self.build_tree:
+                return sql_ast.BinaryOp(operator, left, right)
     
     def parse_condition(self):
-        self.parse_boolean_expression()
-        if self.peek() in ['AND', 'OR']:
-            self.consume(self.peek())
-            self.parse_condition()
+        # AND binds tighter than OR
+        condition = self.parse_boolean_expression()
+        return self.parse_operator_chain(condition, self.parse_boolean_expression, condition_powers)
 
     # lists
+    # the list rules loop over their items instead of recursing once per item,
+    # and return a python list of the item nodes when build_tree is set
     def parse_value_list(self):
-        self.parse_value()
-        if self.peek() in [',']:
-            self.consume(self.peek())
-            self.parse_value_list()
+        values = [] if self.build_tree else None
+        while True:
+            value = self.parse_value()
+            if self.build_tree:
+                values.append(value)
+            if self.peek() != ',':
+                return values
+            self.consume(',')
         
     def parse_field_list(self):
-        self.parse_table_field()
-        if self.peek() in [',']:
-            self.consume(self.peek())
-            self.parse_field_list()
+        fields = [] if self.build_tree else None
+        while True:
+            field = self.parse_table_field()
+            if self.build_tree:
+                fields.append(field)
+            if self.peek() != ',':
+                return fields
+            self.consume(',')
 
     def parse_assignment_list(self):
-
-        #  <table-field> = <value>
-        self.parse_table_field()
-        if self.peek() in ['=']:
-            self.consume(self.peek())
-        else:
-            self.raise_exception('=')
-        self.parse_value()
-
-        #  [, <assignment-list>]
-        if self.peek() in [',']:
-            self.consume(self.peek())
-            self.parse_assignment_list()
+        assignments = [] if self.build_tree else None
+        while True:
+            #  <table-field> = <value>
+            field = self.parse_table_field()
+            if self.peek() == '=':
+                self.consume(self.peek())
+            else:
+                self.raise_exception('=')
+            value = self.parse_value()
+            if self.build_tree:
+                assignments.append(sql_ast.Assignment(field, value))
+
+            #  [, <assignment-list>]
+            if self.peek() != ',':
+                return assignments
+            self.consume(',')
 
     
 
     # query helpers (mostly for select queries)
-    
-    def parse_field_alias_list(self):
-        #  <field-alias>
-        self.parse_field_alias()
-        #  [, <field-alias-list>]
-        if self.peek() in [',']:
-            self.consume(self.peek())
-            self.parse_field_alias_list()
 
     def parse_table_alias_list(self):
-        #  <table-alias>
-        self.parse_table_alias()
-        #  [, <table-alias-list>]
-        if self.peek() in [',']:
-            self.consume(self.peek())
-            self.parse_table_alias_list()
+        tables = [] if self.build_tree else None
+        while True:
+            #  <table-alias>
+            table = self.parse_table_alias()
+            if self.build_tree:
+                tables.append(table)
+            #  [, <table-alias-list>]
+            if self.peek() != ',':
+                return tables
+            self.consume(',')
 
 
     def parse_order_list(self):
-        # <order-item>
-        self.parse_order_item()
-        #  [, <order_list>]
-        if self.peek() in [',']:
-            self.consume(self.peek())
-            self.parse_order_list()
+        items = [] if self.build_tree else None
+        while True:
+            # <order-item>
+            item = self.parse_order_item()
+            if self.build_tree:
+                items.append(item)
+            #  [, <order_list>]
+            if self.peek() != ',':
+                return items
+            self.consume(',')
 
     def parse_order_item(self):
         # <table-field>
-        self.parse_table_field()
+        field = self.parse_table_field()
         # [ASC | DESC]
-        if self.peek() in ['ASC', 'DESC']:
-            self.consume(self.peek())
+        direction = None
+        if self.peek() in order_directions:
+            direction = self.peek()
+            self.consume(direction)
+        if self.build_tree:
+            return sql_ast.OrderItem(field, direction)
 
 
 
     def parse_select_clause(self):
         if self.peek() == '*':
             self.consume('*')
+            if self.build_tree:
+                return [sql_ast.Star()]
         else:
-            self.parse_field_alias_list()
+            return self.parse_field_alias_list()
 
     def parse_field_alias_list(self):
-        
-        self.parse_field_alias()
-        if self.peek() == ',':
+        columns = [] if self.build_tree else None
+        while True:
+            column = self.parse_field_alias()
+            if self.build_tree:
+                columns.append(column)
+            if self.peek() != ',':
+                return columns
             self.consume(',')
-            self.parse_field_alias_list()
 
     def parse_field_alias(self):
-        functions = ['UPPER', 'LOWER', 'ROUND', 'LENGTH', 'ABS', 'SUM', 'AVG', 'COUNT', 'MAX', 'MIN']
-        if self.peek() in functions:
-            self.parse_function()
+        if self.peek() in function_set:
+            function = self.parse_function()
             self.consume('(')
-            self.parse_table_field()
+            field = self.parse_table_field()
             self.consume(')')
-            if self.peek() == 'AS':
-                self.consume('AS')
-                self.parse_alias()
+            if self.build_tree:
+                expression = sql_ast.FunctionCall(function, field)
         else:
-            self.parse_table_field()
-            if self.peek() == 'AS':
-                self.consume('AS')
-                self.parse_alias()
+            expression = self.parse_table_field()
+        alias = None
+        if self.peek() == 'AS':
+            self.consume('AS')
+            alias = self.parse_alias()
+        if self.build_tree:
+            return sql_ast.Column(expression, alias)
 
     def parse_table_alias(self):
-        self.parse_table()
+        table = self.parse_table()
+        alias = None
         if self.peek() == 'AS':
             self.consume('AS')
-            self.parse_alias()
+            alias = self.parse_alias()
+        if self.build_tree:
+            return sql_ast.TableAlias(table, alias)
 
     def parse_table_clause(self):
-        self.parse_table()
-        self.parse_optional_join_clause()
+        # returns the table and its list of joins
+        table = self.parse_table()
+        joins = self.parse_optional_join_clause()
+        return table, joins
 
     def parse_optional_join_clause(self):
-        if self.peek() == 'RIGHT' or self.peek() == 'LEFT' or self.peek() == 'INNER' or self.peek() == 'FULL':
-            self.parse_join_clause()
-            self.parse_optional_join_clause()
+        joins = [] if self.build_tree else None
+        while self.peek() in join_type_set:
+            join = self.parse_join_clause()
+            if self.build_tree:
+                joins.append(join)
+        return joins
 
     def parse_join_clause(self):
-        self.parse_join_type()
+        join_type = self.parse_join_type()
         self.consume('JOIN')
-        self.parse_table()
+        table = self.parse_table()
         self.consume('ON')
-        self.parse_condition()
+        condition = self.parse_condition()
+        if self.build_tree:
+            return sql_ast.Join(join_type, table, condition)
 
     def parse_join_type(self):
-        join_types = ['RIGHT', 'LEFT', 'INNER', 'FULL']
-        if self.peek() in join_types:
-            self.consume(self.peek())
+        join_type = self.peek()
+        if join_type in join_type_set:
+            self.consume(join_type)
         else:
             self.raise_exception(join_types)     
+        return join_type
         
 
     # basic queries
     def parse_insert_query(self):
         self.consume('INSERT')
         self.consume('INTO')
-        self.parse_table()
+        table = self.parse_table()
         self.consume('(')
-        self.parse_field_list()
+        fields = self.parse_field_list()
         self.consume(')')
         self.consume('VALUES')
         self.consume('(')
-        self.parse_value_list()
+        values = self.parse_value_list()
         self.consume(')')
+        if self.build_tree:
+            return sql_ast.Insert(table, fields, values)
 
     def parse_update_query(self):
         self.consume('UPDATE')
-        self.parse_table()
+        table = self.parse_table()
         self.consume('SET')
         self.consume('(')
-        self.parse_assignment_list()
+        assignments = self.parse_assignment_list()
         self.consume(')')
+        where = None
         if self.peek() == 'WHERE':
             self.consume('WHERE')
-            self.parse_condition()
+            where = self.parse_condition()
+        if self.build_tree:
+            return sql_ast.Update(table, assignments, where)
 
     def parse_delete_query(self):
         self.consume('DELETE')
         self.consume('FROM')
-        self.parse_table()
+        table = self.parse_table()
+        where = None
         if self.peek() == 'WHERE':
             self.consume('WHERE')
-            self.parse_condition()
+            where = self.parse_condition()
+        if self.build_tree:
+            return sql_ast.Delete(table, where)
 
     # select query
     def parse_select_query(self):
         self.consume('SELECT')
+        distinct = False
         if self.peek() == 'DISTINCT':
             self.consume('DISTINCT')
-        self.parse_select_clause()
+            distinct = True
+        columns = self.parse_select_clause()
         self.consume('FROM')
-        self.parse_table_clause()
+        table, joins = self.parse_table_clause()
+        where, group_by, having, order_by = self.parse_select_tail()
+        if self.build_tree:
+            return sql_ast.Select(distinct, columns, table, joins, where, group_by, having, order_by)
+
+    def parse_select_tail(self):
+        # the optional clauses after the table clause, returns the where, group by, having and order by parts
+        where = group_by = having = order_by = None
         if self.peek() == 'WHERE':
             self.consume('WHERE')
-            self.parse_condition()
+            where = self.parse_condition()
         if self.peek() == 'GROUP':
             self.consume('GROUP')
             self.consume('BY')
-            self.parse_field_list()
+            group_by = self.parse_field_list()
         if self.peek() == 'HAVING':
             self.consume('HAVING')
-            self.parse_condition()
+            having = self.parse_condition()
         if self.peek() == 'ORDER':
             self.consume('ORDER')
             self.consume('BY')
-            self.parse_order_list()
+            order_by = self.parse_order_list()
+        return where, group_by, having, order_by
 
     # big picture sql
     def parse_comment(self):
-        match = re.search(r'^\s*/\*.*?\*/\s*$', self.peek(), re.DOTALL)
-        if match:
-            self.consume(self.peek())
+        comment = self.peek()
+        if self.peek_kind() == COMMENT:
+            self.consume(comment)
         else:
             self.raise_exception('<commment>')
+        if self.build_tree:
+            return sql_ast.Comment(comment)
 
     def parse_statement(self):
-        if self.peek() == 'SELECT':
-            self.parse_select_query()
+        method = statement_methods.get(self.peek())
+        if method is not None:
+            statement = getattr(self, method)()
             self.consume(';')
-        elif self.peek() == 'INSERT':
-            self.parse_insert_query()
-            self.consume(';')
-        elif self.peek() == 'UPDATE':
-            self.parse_update_query()
-            self.consume(';')
-        elif self.peek() == 'DELETE':
-            self.parse_delete_query()
-            self.consume(';')
-        elif self.peek().startswith('/*'):
-            self.parse_comment()
+        elif self.peek_kind() == COMMENT:
+            statement = self.parse_comment()
         else:
             self.raise_exception(['<select>', '<insert>', '<update>', '<delete>', '<comment>'])
+        return statement
 
     def parse_sql(self):
-        self.parse_statement()
-        if self.peek() is not None:
-            self.parse_sql()
+        parse_statement = self.recover_statement if self.recover else self.parse_statement
+        statements = [] if self.build_tree else None
+        while True:
+            statement = parse_statement()
+            if self.build_tree:
+                statements.append(statement)
+            if self.peek() is None:
+                break
+        if self.build_tree:
+            return sql_ast.Script(statements)
 
 
 
-test_cases = [
-"""
+if __name__ == '__main__':
+    test_cases = [
+    """
 
-SELECT DISTINCT users.first_name AS 'Given Name', users.last_name AS 'Surname', SUM(users.id) AS 'Total Spent on Large Orders'
-FROM users
-RIGHT JOIN orders ON users.id = orders.user_id
-WHERE users.id IS NOT NULL AND users.email LIKE '%@hotmail.com' AND orders.amount >= ((100) * 1.05) - (5)
-GROUP BY users.id
-HAVING SUM(orders.amount) > 1000 AND COUNT(orders.id) > 5
-ORDER BY users.first_name DESC, users.last_name DESC;
-""",
-]
+    SELECT DISTINCT users.first_name AS 'Given Name', users.last_name AS 'Surname', SUM(users.id) AS 'Total Spent on Large Orders'
+    FROM users
+    RIGHT JOIN orders ON users.id = orders.user_id
+    WHERE users.id IS NOT NULL AND users.email LIKE '%@hotmail.com' AND orders.amount >= ((100) * 1.05) - (5)
+    GROUP BY users.id
+    HAVING SUM(orders.amount) > 1000 AND COUNT(orders.id) > 5
+    ORDER BY users.first_name DESC, users.last_name DESC;
+    """,
+    ]
 
-for test in test_cases:
-    parser = Parser(test)
-    print(parser.parse())
+    for test in test_cases:
+        parser = Parser(test)
+        print(parser.parse())
@@ -0,0 +1,215 @@
+"""
+Statement-at-a-time parsing for SQL inputs that are too large to hold in memory at once.
+
+The input is read in chunks and cut into statements at every ';' and around every comment
+(a comment is a statement of its own in the grammar), skipping anything inside strings and
+comments. Each statement is parsed with sql_parser_v2 as soon as it is complete, so only the
+statement being read is kept in memory.
+
+iter_file() parses a file through a memory map instead: the operating system pages the file in as it
+is scanned, and statements are tokenized straight from the mapped bytes without being copied or decoded
+into a str first. Positions are then byte offsets into the file. Run it over a dump with:
+    python sql_stream.py dump.sql [--recover]
+"""
+import argparse
+import codecs
+import contextlib
+import mmap
+import os
+import re
+
+from sql_parser_v2 import Parser
+
+NORMAL, STRING, COMMENT = range(3)
+
+text_patterns = {
+    NORMAL: re.compile(r"[;']|/\*"),
+    STRING: re.compile(r"['\n]"), # strings can't span lines, same as in the tokenizer
+}
+binary_patterns = {
+    NORMAL: re.compile(rb"[;']|/\*"),
+    STRING: re.compile(rb"['\n]"),
+}
+nonblank_pattern = re.compile(rb'\S')
+
+
+class Scanner:
+    """
+    Finds statement boundaries in a buffer, remembering where it stopped and whether it was inside
+    a string or comment, so scanning can continue once more of the input has been read.
+
+    Works on str as well as on bytes-like buffers (bytes, mmap) with binary=True.
+    """
+    def __init__(self, binary=False):
+        self.state = NORMAL
+        self.pos = 0
+        patterns = binary_patterns if binary else text_patterns
+        self.normal_pattern = patterns[NORMAL]
+        self.string_end_pattern = patterns[STRING]
+        self.semicolon, self.quote, self.slash, self.comment_end = (b';', b"'", b'/', b'*/') if binary else (';', "'", '/', '*/')
+
+    def next_boundary(self, buffer, end=None):
+        """
+        Returns the index in buffer where the next statement boundary is, or None if buffer[:end]
+        has no further boundary. A boundary is right after a ';', before a '/*' and after a '*/'.
+        """
+        if end is None:
+            end = len(buffer)
+        while True:
+            if self.state == NORMAL:
+                match = self.normal_pattern.search(buffer, self.pos, end)
+                if match is None:
+                    # a '/' at the end might turn out to start a comment once the next chunk is read
+                    if end > self.pos and buffer[end - 1:end] == self.slash:
+                        self.pos = end - 1
+                    else:
+                        self.pos = end
+                    return None
+                token = match.group()
+                self.pos = match.end()
+                if token == self.semicolon:
+                    return self.pos
+                elif token == self.quote:
+                    self.state = STRING
+                else:
+                    self.state = COMMENT
+                    return match.start()
+            elif self.state == STRING:
+                match = self.string_end_pattern.search(buffer, self.pos, end)
+                if match is None:
+                    self.pos = end
+                    return None
+                self.state = NORMAL
+                self.pos = match.end()
+            else:
+                i = buffer.find(self.comment_end, self.pos, end)
+                if i < 0:
+                    # keep a trailing '*' for the next chunk, it might be followed by '/'
+                    self.pos = max(self.pos, end - 1)
+                    return None
+                self.state = NORMAL
+                self.pos = i + 2
+                return self.pos
+
+
+def split_statements(chunks):
+    """
+    Splits an iterable of text chunks into statements.
+    Yields (offset, statement) pairs, offset being the position of the statement in the whole input.
+    Whitespace between statements is left out, text after the last boundary is yielded as is.
+    """
+    scanner = Scanner()
+    buffer = ''
+    offset = 0 # position of buffer[0] in the whole input
+    for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            boundary = scanner.next_boundary(buffer)
+            if boundary is None:
+                break
+            statement = buffer[start:boundary]
+            if statement.strip():
+                yield offset + start, statement
+            start = boundary
+
+        # only drop the consumed part once per chunk, not once per statement
+        buffer = buffer[start:]
+        offset += start
+        scanner.pos -= start
+
+    if buffer.strip():
+        yield offset, buffer
+
+
+def read_chunks(file_obj, chunk_size):
+    # reads text chunks from a text or binary file object (or socket.makefile()), decoding bytes as utf-8
+    decoder = None
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = decoder.decode(chunk)
+        yield chunk
+    if decoder is not None:
+        rest = decoder.decode(b'', final=True)
+        if rest:
+            yield rest
+
+
+def iter_statements(file_obj, chunk_size=1 << 16, **parser_options):
+    """
+    Parses the SQL read from file_obj one statement at a time.
+    Yields (offset, parse result) per statement as soon as the statement has been read.
+    Error positions in the results are positions in the whole input.
+    parser_options are passed on to sql_parser_v2.Parser.
+    """
+    for offset, statement in split_statements(read_chunks(file_obj, chunk_size)):
+        yield offset, Parser(statement, offset=offset, **parser_options).parse()
+
+
+def statement_ranges(buffer, start=0, end=None):
+    """
+    Splits buffer[start:end] of a bytes-like buffer (bytes, mmap) into statements, start being a statement boundary.
+    Yields (start, end) byte ranges, leaving out whitespace between statements like split_statements.
+    """
+    if end is None:
+        end = len(buffer)
+    scanner = Scanner(binary=True)
+    scanner.pos = start
+    while start < end:
+        boundary = scanner.next_boundary(buffer, end)
+        if boundary is None:
+            boundary = end
+        if nonblank_pattern.search(buffer, start, boundary):
+            yield start, boundary
+        start = boundary
+
+
+def parse_range(view, start, end, parser_options):
+    # parses view[start:end] without copying it; nothing referring to the slice outlives the call
+    return Parser(view[start:end], offset=start, **parser_options).parse()
+
+
+@contextlib.contextmanager
+def mapped_file(path):
+    # a read-only memory map of the file at path and a memoryview of it, empty bytes for an empty file
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0: # empty files can't be mapped
+            yield b'', memoryview(b'')
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            view = memoryview(mapped)
+            try:
+                yield mapped, view
+            finally:
+                view.release() # the map can't be closed while a view of it exists
+
+
+def iter_file(path, **parser_options):
+    """
+    Parses the SQL file at path one statement at a time from a memory map of it.
+    Yields (offset, parse result) per statement like iter_statements, but offsets and error positions
+    are byte offsets in the file. The file is read as utf-8; in bytes only ascii whitespace separates tokens.
+    """
+    with mapped_file(path) as (mapped, view):
+        for start, end in statement_ranges(mapped):
+            yield start, parse_range(view, start, end, parser_options)
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='Parses a SQL file statement by statement and prints the errors.')
+    arg_parser.add_argument('path')
+    arg_parser.add_argument('--recover', action='store_true', help='report every error in a statement, not just the first')
+    args = arg_parser.parse_args()
+
+    statements = failed = 0
+    for offset, result in iter_file(args.path, recover=args.recover):
+        statements += 1
+        if not result.ok:
+            failed += 1
+            print(f'statement at byte {offset}: {result}')
+    print(f'{statements} statements, {failed} with errors')